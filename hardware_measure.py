@@ -1,23 +1,101 @@
-# monitor_hw_usage.py
+# hardware_measure.py
+import sys
 import time
 import psutil
 import math
-from collections import defaultdict
+import functools
+import heapq
+import operator
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
-from typing import Dict, List, Tuple, Optional, Any
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Optional, Any
 
 # ----- GPU/NPU (PDH) via pywin32 -----
-try:
-    import win32pdh
-    HAS_PDH = True
-except Exception:
-    HAS_PDH = False
+# pywin32の読み込みは重いため、最初にPDHを使う時点まで遅延させる
+win32pdh = None
+
+@functools.lru_cache(maxsize=1)
+def _load_pdh() -> bool:
+    """win32pdhを遅延インポートし、利用可能かどうかを返す"""
+    global win32pdh
+    try:
+        import win32pdh as module
+    except Exception:
+        return False
+    win32pdh = module
+    return True
+
+# 毎ティック呼ぶpsutil関数は属性参照を省くため束縛しておく
+_disk_io_counters = psutil.disk_io_counters
+_net_io_counters = psutil.net_io_counters
 
 REFRESH_SEC = 1.0
+# レートカウンターの差分が安定する最小の収集間隔
+PDH_MIN_SAMPLE_SEC = 0.2
+SNAPSHOT_BUFFER_LEN = 4
+# virtual_memory()を再取得する間隔（1Hz更新ではおよそ2ティックに1回）
+MEMORY_SAMPLE_SEC = 1.5
+# 累積平均の格納位置（HardwareMonitor._sums / _cnts のインデックス）
+IDX_CPU, IDX_MEM, IDX_GPU, IDX_NPU, IDX_DISK_READ, IDX_DISK_WRITE, IDX_NET_SEND, IDX_NET_RECV = range(8)
+N_AVERAGES = 8
+# インスタンス名の判定結果キャッシュ上限（プロセス入れ替わりで増え続けないように）
+NAME_FILTER_CACHE_MAX = 4096
+
+# (名前, 値) のタプルを値で比較するキー関数（呼び出しごとに生成しない）
+_BY_VALUE = operator.itemgetter(1)
+
+# summarize_engine_utilで最大値集計に切り替えるinclude_names（小文字）
+_COMPUTE_TAGS = frozenset(('compute', 'engtype_compute'))
+
+# 表示用テンプレート（毎ティック同じレイアウトなので事前に用意）
+_SEPARATOR = "\n" + "-" * 78
+_CPU_FMT = "CPU   : avg {} | curr {:5.1f}% | per-core: {}"
+_MEM_FMT = "Memory: avg {} | curr {:5.1f}% ({}/{})"
+_DISK_FMT = "Disk  : avg {} | curr {}"
+_NET_FMT = "Net   : avg {} | curr {}"
+_GPU_FMT = "GPUComp: avg {} | curr {:5.1f}% | top {}"
+_GPU_NA = "GPUComp: n/a (counters not available)"
+_NPU_FMT = "NPU   : avg {} | curr {} | top {}{}"
+
+_UNITS_B = ('B', 'KB', 'MB', 'GB', 'TB')
+_UNITS_BPS = ('B/s', 'KB/s', 'MB/s', 'GB/s', 'TB/s')
+_UNIT_DIV = tuple(1 << (10 * k) for k in range(len(_UNITS_B)))
+
+
+def _processor_sort_key(instance: str) -> Tuple[int, ...]:
+    """"0,12" 形式のプロセッサインスタンス名を (グループ, 番号) の順序キーに変換"""
+    return tuple(int(part) if part.isdigit() else -1 for part in instance.split(','))
+
+
+@functools.lru_cache(maxsize=8)
+def _percore_format(n_cores: int) -> str:
+    """コア数分の "%4.0f%%" を連結した書式（% 演算子で一括フォーマット）"""
+    return ", ".join(["%4.0f%%"] * n_cores)
+
+
+def _format_pct(value: Optional[float]) -> str:
+    return f"{value:5.1f}%" if value is not None else "  n/a"
+
+
+def _format_scaled(n: float, units: Tuple[str, ...]) -> str:
+    """1024単位のスケールをビット長から直接求めてフォーマット"""
+    i = (int(n).bit_length() - 1) // 10
+    if i < 0:
+        i = 0
+    elif i >= len(units):
+        i = len(units) - 1
+    return f"{n / _UNIT_DIV[i]:.1f}{units[i]}"
+
 
 class MetricsCollector(ABC):
     """メトリクス収集の抽象基底クラス"""
     
+    __slots__ = ()
+    
     @abstractmethod
     def collect(self) -> Dict[str, Any]:
         pass
@@ -26,54 +104,141 @@ class MetricsCollector(ABC):
     def is_available(self) -> bool:
         pass
 
-class RunningAverage:
-    """効率的な累積平均計算"""
-    def __init__(self):
-        self._total = 0.0
-        self._count = 0
-
-    def add(self, value: Optional[float]) -> None:
-        if value is not None:
-            self._total += float(value)
-            self._count += 1
-
-    def has_samples(self) -> bool:
-        return self._count > 0
+def _close_pdh_query(handle) -> None:
+    """PDHクエリハンドルを閉じる（weakref.finalizeから呼ばれるためPDHQueryを参照しない）"""
+    try:
+        win32pdh.CloseQuery(handle)
+    except Exception:
+        pass
 
-    def average(self) -> float:
-        return self._total / self._count if self._count else 0.0
+class PDHQuery:
+    """
+    複数のPDHカウンターを1つのクエリハンドルにまとめる
+    
+    CollectQueryDataはクエリ単位で実行されるため、CPU/GPU/NPUのカウンターを
+    同じクエリに登録すればティックごとに1回の収集で済む。
+    """
+    
+    __slots__ = ('handle', '_last_collect', '_finalizer', '__weakref__')
+    
+    def __init__(self):
+        self.handle = None
+        self._last_collect: Optional[float] = None
+        self._finalizer = None
+        if _load_pdh():
+            try:
+                self.handle = win32pdh.OpenQuery()
+            except Exception:
+                self.handle = None
+        if self.handle is not None:
+            # 明示的にclose()されなかった場合も、GC時またはプロセス終了時にハンドルを解放する
+            self._finalizer = weakref.finalize(self, _close_pdh_query, self.handle)
+    
+    def __enter__(self) -> "PDHQuery":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+    
+    def is_open(self) -> bool:
+        return self.handle is not None
+    
+    def close(self) -> None:
+        """クエリハンドルを閉じる（登録済みのカウンターもまとめて解放される）"""
+        self.handle = None
+        if self._finalizer is not None:
+            # finalizerは1回だけ実行されるため、GC時に二重に閉じることはない
+            self._finalizer()
+    
+    def add_counter(self, path: str):
+        return win32pdh.AddCounter(self.handle, path)
+    
+    def collect(self) -> None:
+        """CollectQueryDataを即時実行"""
+        win32pdh.CollectQueryData(self.handle)
+        self._last_collect = time.monotonic()
+    
+    def sample(self) -> bool:
+        """
+        登録済みの全カウンターを収集
+        
+        直前の収集から PDH_MIN_SAMPLE_SEC 経っていない場合のみ、その残り時間だけ待つ。
+        
+        Returns:
+            収集に成功した場合True
+        """
+        if self.handle is None:
+            return False
+        if self._last_collect is not None:
+            wait = PDH_MIN_SAMPLE_SEC - (time.monotonic() - self._last_collect)
+            if wait > 0:
+                time.sleep(wait)
+        try:
+            self.collect()
+            return True
+        except Exception:
+            return False
 
 class PDHCollector(MetricsCollector):
-    """PDH (Performance Data Helper) メトリクスコレクター"""
+    """
+    PDH (Performance Data Helper) メトリクスコレクター
+    
+    queryを渡した場合はそのクエリにカウンターを相乗りさせ、収集（sample）は
+    クエリの所有者が行う。省略時は専用クエリを持つので、collect()の前に
+    ティックごとにsample()を呼ぶこと。
+    """
     
-    def __init__(self, path_pattern: str, include_names: List[str] = None, exclude_contains: List[str] = None):
+    __slots__ = ('path_pattern', 'include_names', 'exclude_contains', '_inc_lc', '_exc_lc', '_name_allowed',
+                 'query', '_owns_query', 'wildcard_counter', 'counters', '_available')
+    
+    def __init__(self, path_pattern: str, include_names: List[str] = None, exclude_contains: List[str] = None,
+                 query: Optional[PDHQuery] = None):
         self.path_pattern = path_pattern
         self.include_names = include_names or []
         self.exclude_contains = exclude_contains or []
-        self.query = None
+        # フィルタ用のキーワードは小文字化して一度だけ保持する
+        self._inc_lc = tuple(tag.lower() for tag in self.include_names)
+        self._exc_lc = tuple(tag.lower() for tag in self.exclude_contains)
+        # インスタンス名 -> include/exclude判定結果（名前はティック間でほぼ不変）
+        self._name_allowed: Dict[str, bool] = {}
+        self.query = query
+        self._owns_query = query is None
+        self.wildcard_counter = None
         self.counters = []
         self._available = False
         self._try_build()
     
     def _try_build(self) -> None:
-        if not HAS_PDH:
+        if not _load_pdh():
             return
         try:
-            paths = win32pdh.ExpandCounterPath(self.path_pattern)
-            if not paths:
+            if self.query is None:
+                self.query = PDHQuery()
+            if not self.query.is_open():
                 return
             
-            self.query = win32pdh.OpenQuery()
-            self.counters = []
-            for p in paths:
+            # ワイルドカードのまま1カウンターとして登録し、全インスタンスを一括取得する
+            if hasattr(win32pdh, 'GetFormattedCounterArray'):
                 try:
-                    h = win32pdh.AddCounter(self.query, p)
-                    self.counters.append((h, p))
+                    self.wildcard_counter = self.query.add_counter(self.path_pattern)
                 except Exception:
-                    pass
+                    self.wildcard_counter = None
             
-            if self.counters:
-                win32pdh.CollectQueryData(self.query)
+            # 古いpywin32向けのフォールバック: インスタンスを展開して個別に登録
+            if self.wildcard_counter is None:
+                paths = win32pdh.ExpandCounterPath(self.path_pattern)
+                self.counters = []
+                for p in paths or []:
+                    try:
+                        h = self.query.add_counter(p)
+                    except Exception:
+                        continue
+                    # パスは固定なのでインスタンス名は登録時に一度だけ切り出す
+                    inst = p[p.find('(')+1:p.find(')')] if '(' in p and ')' in p else p
+                    self.counters.append((h, inst))
+            
+            if self.wildcard_counter is not None or self.counters:
+                self.query.collect()  # 初回の差分用にプライミング
                 self._available = True
         except Exception:
             pass
@@ -81,19 +246,38 @@ class PDHCollector(MetricsCollector):
     def is_available(self) -> bool:
         return self._available
 
+    def sample(self) -> bool:
+        """このコレクターのクエリを収集（共有クエリの場合は所有者が呼ぶ）"""
+        if not self._available:
+            return False
+        return self.query.sample()
+    
+    def close(self) -> None:
+        """専用クエリを持つ場合は閉じる（共有クエリは所有者が閉じる）"""
+        self._available = False
+        if self._owns_query and self.query is not None:
+            self.query.close()
+    
+    def __enter__(self) -> "PDHCollector":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
     def collect(self) -> Dict[str, Any]:
+        """直近のsample()で収集済みの値を読み出す（ここでは収集しない）"""
         if not self._available:
             return {}
         
         try:
-            time.sleep(0.2)
-            win32pdh.CollectQueryData(self.query)
-            data = {}
+            if self.wildcard_counter is not None:
+                data = win32pdh.GetFormattedCounterArray(self.wildcard_counter, win32pdh.PDH_FMT_DOUBLE)
+                return self._filter_data(data)
             
-            for h, p in self.counters:
+            data = {}
+            for h, inst in self.counters:
                 try:
                     t, val = win32pdh.GetFormattedCounterValue(h, win32pdh.PDH_FMT_DOUBLE)
-                    inst = p[p.find('(')+1:p.find(')')] if '(' in p and ')' in p else p
                     data[inst] = float(val)
                 except Exception:
                     pass
@@ -112,15 +296,16 @@ class PDHCollector(MetricsCollector):
         Returns:
             フィルタリング済みのデータ
         """
+        has_name_filter = bool(self._inc_lc or self._exc_lc)
+        name_allowed = self._name_allowed
         filtered = {}
         for name, value in data.items():
-            # include_namesが指定されている場合、そのキーワードを含むもののみ
-            if self.include_names and not any(tag.lower() in name.lower() for tag in self.include_names):
-                continue
-            
-            # exclude_containsが指定されている場合、そのキーワードを含むものを除外
-            if self.exclude_contains and any(tag.lower() in name.lower() for tag in self.exclude_contains):
-                continue
+            if has_name_filter:
+                allowed = name_allowed.get(name)
+                if allowed is None:
+                    allowed = self._classify_name(name)
+                if not allowed:
+                    continue
             
             # 無効・NaNを除外
             try:
@@ -133,47 +318,106 @@ class PDHCollector(MetricsCollector):
             filtered[name] = numeric
         return filtered
 
+    def _classify_name(self, name: str) -> bool:
+        """インスタンス名がinclude/exclude条件を満たすか判定し、結果をキャッシュする"""
+        name_lc = name.lower()
+        # include_namesが指定されている場合、そのキーワードを含むもののみ
+        allowed = not self._inc_lc
+        for tag in self._inc_lc:
+            if tag in name_lc:
+                allowed = True
+                break
+        # exclude_containsが指定されている場合、そのキーワードを含むものを除外
+        if allowed:
+            for tag in self._exc_lc:
+                if tag in name_lc:
+                    allowed = False
+                    break
+        
+        if len(self._name_allowed) >= NAME_FILTER_CACHE_MAX:
+            self._name_allowed.clear()
+        self._name_allowed[name] = allowed
+        return allowed
+
 class SystemCollector(MetricsCollector):
     """システムメトリクス（CPU、メモリ、ディスク、ネットワーク）コレクター"""
     
-    def __init__(self):
+    __slots__ = ('last_disk_io', 'last_net_io', 'last_sample_ns', '_mem_cache', 'cpu_collector', '_owns_pdh_query')
+    
+    def __init__(self, pdh_query: Optional[PDHQuery] = None):
         self.last_disk_io = None
         self.last_net_io = None
-        self.last_sample_ts = time.monotonic()
+        self.last_sample_ns = time.perf_counter_ns()
+        # (取得時刻ns, virtual_memory()の結果)
+        self._mem_cache: Optional[Tuple[int, Any]] = None
+        # タスクマネージャーと同じ % Processor Utility（周波数スケーリング考慮）
+        self.cpu_collector = PDHCollector(r"\Processor Information(*)\% Processor Utility", query=pdh_query)
+        # 共有クエリが渡されなかった場合は自分で収集する
+        self._owns_pdh_query = pdh_query is None
     
     def is_available(self) -> bool:
         return True
     
-    def collect(self) -> Dict[str, Any]:
-        current_time = time.monotonic()
-        elapsed = max(current_time - self.last_sample_ts, 1e-6)
+    def close(self) -> None:
+        self.cpu_collector.close()
+    
+    def collect(self, io_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        CPU・メモリ・ディスク・ネットワークをまとめて取得
+        
+        Args:
+            io_data: 今回のティックで取得済みのcollect_io()の結果（Noneの場合はここで取得する）
+        """
+        if io_data is None:
+            io_data = self.collect_io()
+        
+        # CPU: PDHが使える場合はタスクマネージャー準拠の値を優先
+        cpu_overall, cpu_per = self._collect_pdh_cpu()
+        if cpu_per is None:
+            # コア別を1回だけ取得し、全体はその平均から求める
+            cpu_per = psutil.cpu_percent(interval=None, percpu=True)
+            cpu_overall = sum(cpu_per) / len(cpu_per) if cpu_per else 0.0
+        
+        io_data['cpu_overall'] = cpu_overall
+        io_data['cpu_per_core'] = cpu_per
+        return io_data
+    
+    def collect_io(self) -> Dict[str, Any]:
+        """
+        psutilのメモリ・ディスク・ネットワーク値を取得（PDHの収集とは独立）
+        """
+        now_ns = time.perf_counter_ns()
+        elapsed = (now_ns - self.last_sample_ns) * 1e-9
+        if elapsed <= 0:
+            elapsed = REFRESH_SEC
         
-        # CPU & Memory
-        cpu_overall = psutil.cpu_percent(interval=None)
-        cpu_per = psutil.cpu_percent(interval=None, percpu=True)
-        vm = psutil.virtual_memory()
+        # Memory: 短時間ではほとんど変化しないため、MEMORY_SAMPLE_SEC の間は前回値を使う
+        mem_cache = self._mem_cache
+        if mem_cache is None or (now_ns - mem_cache[0]) * 1e-9 >= MEMORY_SAMPLE_SEC:
+            mem_cache = self._mem_cache = (now_ns, psutil.virtual_memory())
+        vm = mem_cache[1]
         
-        # Disk I/O
-        disk_io = psutil.disk_io_counters()
+        # Disk I/O（nowrap=Trueで32bitラップやリセットはpsutil側が補正するため差分は負にならない）
+        disk_io = _disk_io_counters(nowrap=True)
         disk_read_rate = disk_write_rate = None
-        if self.last_disk_io:
-            disk_read_rate = max(0.0, disk_io.read_bytes - self.last_disk_io.read_bytes) / elapsed
-            disk_write_rate = max(0.0, disk_io.write_bytes - self.last_disk_io.write_bytes) / elapsed
+        last_disk_io = self.last_disk_io
+        if last_disk_io:
+            disk_read_rate = (disk_io.read_bytes - last_disk_io.read_bytes) / elapsed
+            disk_write_rate = (disk_io.write_bytes - last_disk_io.write_bytes) / elapsed
         self.last_disk_io = disk_io
         
         # Network I/O
-        net_io = psutil.net_io_counters()
+        net_io = _net_io_counters(nowrap=True)
         net_send_rate = net_recv_rate = None
-        if self.last_net_io:
-            net_send_rate = max(0.0, net_io.bytes_sent - self.last_net_io.bytes_sent) / elapsed
-            net_recv_rate = max(0.0, net_io.bytes_recv - self.last_net_io.bytes_recv) / elapsed
+        last_net_io = self.last_net_io
+        if last_net_io:
+            net_send_rate = (net_io.bytes_sent - last_net_io.bytes_sent) / elapsed
+            net_recv_rate = (net_io.bytes_recv - last_net_io.bytes_recv) / elapsed
         self.last_net_io = net_io
         
-        self.last_sample_ts = current_time
+        self.last_sample_ns = now_ns
         
         return {
-            'cpu_overall': cpu_overall,
-            'cpu_per_core': cpu_per,
             'memory_percent': vm.percent,
             'memory_used': vm.used,
             'memory_total': vm.total,
@@ -183,17 +427,44 @@ class SystemCollector(MetricsCollector):
             'net_recv_rate': net_recv_rate
         }
 
+    def _collect_pdh_cpu(self) -> Tuple[Optional[float], Optional[List[float]]]:
+        """
+        PDHの % Processor Utility から全体とコア別のCPU使用率を取得
+        
+        Returns:
+            (overall_percent, per_core_list): PDHが利用できない場合は (None, None)
+        """
+        if not self.cpu_collector.is_available():
+            return (None, None)
+        
+        if self._owns_pdh_query:
+            self.cpu_collector.sample()
+        data = self.cpu_collector.collect()
+        overall = data.pop('_Total', None)
+        if overall is None:
+            return (None, None)
+        
+        # インスタンス名は "グループ,コア番号"。"0,_Total" などのグループ合計は除外
+        cores = [(name, value) for name, value in data.items() if '_Total' not in name]
+        cores.sort(key=lambda item: _processor_sort_key(item[0]))
+        # ターボ時は100%を超えるため、タスクマネージャー同様に100%でクランプ
+        per_core = [min(value, 100.0) for _, value in cores]
+        return (min(overall, 100.0), per_core)
+
 class UtilityFunctions:
     """ユーティリティ関数群"""
     
     @staticmethod
-    def summarize_engine_util(data: Dict[str, float], include_names: List[str] = None) -> Tuple[float, List[Tuple[str, float]]]:
+    def summarize_engine_util(data: Dict[str, float], include_names: List[str] = None,
+                              validated: bool = False) -> Tuple[float, List[Tuple[str, float]]]:
         """
         PDHのGPU/NPU Engine*(インスタンス)を集計。
         
         Args:
             data: エンジンデータ (インスタンス名 -> 使用率)
             include_names: サマリに含めたいキーワード（例: ['Compute', '3D']）
+            validated: PDHCollector.collect()の結果など、数値化とNaN/負値の除外が
+                済んでいるデータの場合True（再検証を省略する）
             
         Returns:
             (overall_percent, top5_list): 全体使用率とトップ5のリスト
@@ -201,25 +472,33 @@ class UtilityFunctions:
         if not data:
             return (0.0, [])
         
-        # データの有効性チェック
-        filtered = {}
-        for name, value in data.items():
-            try:
-                numeric = float(value)
-            except (TypeError, ValueError):
-                continue
-            if math.isnan(numeric) or numeric < 0:
-                continue
-            filtered[name] = numeric
+        if validated:
+            filtered = data
+        else:
+            # データの有効性チェック
+            filtered = {}
+            for name, value in data.items():
+                try:
+                    numeric = float(value)
+                except (TypeError, ValueError):
+                    continue
+                if math.isnan(numeric) or numeric < 0:
+                    continue
+                filtered[name] = numeric
         
         if not filtered:
             return (0.0, [])
         
-        # トップ5のリストを作成
-        top = sorted(filtered.items(), key=lambda item: item[1], reverse=True)[:5]
+        # トップ5のリストを作成（全体ソートは不要）
+        top = heapq.nlargest(5, filtered.items(), key=_BY_VALUE)
         
         # Compute Engine専用の場合、より精密な計算
-        if include_names and any(name.lower() in ['compute', 'engtype_compute'] for name in include_names):
+        compute_only = False
+        for name in include_names or ():
+            if name.lower() in _COMPUTE_TAGS:
+                compute_only = True
+                break
+        if compute_only:
             # Compute Engineの場合、最大値を採用（並列処理を考慮）
             overall = max(filtered.values()) if filtered else 0.0
         else:
@@ -230,44 +509,33 @@ class UtilityFunctions:
     
     @staticmethod
     def format_top_list(top_list: List[Tuple[str, float]], max_items: int = 5) -> str:
-        return ", ".join([f"{k}:{v:.0f}%" for k, v in top_list[:max_items]])
+        return ", ".join(["%s:%.0f%%" % kv for kv in top_list[:max_items]])
     
     @staticmethod
     def human_bytes(n: Optional[float]) -> str:
         if n is None:
             return "n/a"
-        units = ['B','KB','MB','GB','TB']
-        i, f = 0, float(n)
-        while f >= 1024 and i < len(units)-1:
-            f /= 1024.0
-            i += 1
-        return f"{f:.1f}{units[i]}"
+        return _format_scaled(n, _UNITS_B)
     
     @staticmethod
     def human_bytes_per_s(n: Optional[float]) -> str:
         if n is None:
             return "n/a"
-        units = ['B/s','KB/s','MB/s','GB/s','TB/s']
-        i, f = 0, float(n)
-        while f >= 1024 and i < len(units)-1:
-            f /= 1024.0
-            i += 1
-        return f"{f:.1f}{units[i]}"
+        return _format_scaled(n, _UNITS_BPS)
 
 class NPUDetector:
     """NPUデバイス検出クラス"""
     
     @staticmethod
+    @functools.lru_cache(maxsize=1)
     def detect_intel_ai_boost() -> bool:
-        """Intel AI Boost NPUを検出"""
+        """Intel AI Boost NPUを検出（WMI列挙は重いため結果をキャッシュ）"""
         try:
             import wmi
             c = wmi.WMI()
-            devices = c.Win32_PnPEntity()
-            for device in devices:
-                device_name = str(getattr(device, 'Name', ''))
-                if 'Intel(R) AI Boost' in device_name:
-                    return True
+            # 全PnPデバイスを列挙せず、WMI側で名前を絞り込む
+            devices = c.query("SELECT Name FROM Win32_PnPEntity WHERE Name LIKE '%Intel(R) AI Boost%'")
+            return bool(devices)
         except Exception:
             pass
         return False
@@ -277,24 +545,38 @@ class NPUDetector:
         """NPU Performance Countersの利用可能性をチェック"""
         try:
             import win32pdh
-            paths = win32pdh.ExpandCounterPath(r"\NPU Engine(*)\Utilization Percentage")
-            return bool(paths)
+            # インスタンス展開ではなく、登録済みパフォーマンスオブジェクト一覧で判定
+            objects = win32pdh.EnumObjects(None, None, win32pdh.PERF_DETAIL_WIZARD, 0)
+            return "NPU Engine" in objects
         except Exception:
             return False
     
     @staticmethod
-    def print_npu_status():
-        """NPU検出状況を表示"""
+    def print_npu_status(intel_ai_boost_found: Optional[bool] = None,
+                         npu_counters_available: Optional[bool] = None):
+        """
+        NPU検出状況を表示
+        
+        Args:
+            intel_ai_boost_found: 検出済みの結果（Noneの場合、PDHカウンターが無いときだけ検出する）
+            npu_counters_available: 確認済みの結果（Noneの場合はここで確認する）
+        """
         print("NPU Detection Status:")
         print("-" * 40)
         
-        intel_ai_boost_found = NPUDetector.detect_intel_ai_boost()
+        # 安価なPDH確認を先に行い、カウンターがあれば重いWMI検出は省略する
+        if npu_counters_available is None:
+            npu_counters_available = NPUDetector.check_npu_counters()
+        if intel_ai_boost_found is None and not npu_counters_available:
+            intel_ai_boost_found = NPUDetector.detect_intel_ai_boost()
+        
         if intel_ai_boost_found:
             print("✓ Intel AI Boost NPU detected")
+        elif intel_ai_boost_found is None:
+            print("- Intel AI Boost WMI probe skipped (NPU counters present)")
         else:
             print("✗ Intel AI Boost NPU not detected")
         
-        npu_counters_available = NPUDetector.check_npu_counters()
         if npu_counters_available:
             print("✓ NPU Performance Counters available")
         else:
@@ -307,49 +589,143 @@ class NPUDetector:
             print("\nCURRENT STATUS:")
             print("  - NPU hardware: ✓ Detected (Intel AI Boost)")
             print("  - PDH counters: ✗ Not available (expected on most systems)")
-        else:
+        elif not npu_counters_available:
             print("\nNOTE: No NPU detected on this system")
         
         print()  # 空行
 
 
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """1ティック分の計測結果（表示スレッドへ渡す計算済みの値）"""
+    timestamp: float
+    cpu_overall: float
+    cpu_per_core: Tuple[float, ...]
+    memory_percent: float
+    memory_used: int
+    memory_total: int
+    disk_read_rate: Optional[float]
+    disk_write_rate: Optional[float]
+    net_send_rate: Optional[float]
+    net_recv_rate: Optional[float]
+    gpu_available: bool
+    gpu_overall: float
+    gpu_top: Tuple[Tuple[str, float], ...]
+    npu_has_data: bool
+    npu_overall: float
+    npu_top: Tuple[Tuple[str, float], ...]
+    # 累積平均（サンプルがまだ無い場合はNone）
+    cpu_avg: Optional[float]
+    memory_avg: Optional[float]
+    disk_read_avg: Optional[float]
+    disk_write_avg: Optional[float]
+    net_send_avg: Optional[float]
+    net_recv_avg: Optional[float]
+    gpu_avg: Optional[float]
+    npu_avg: Optional[float]
+
+class SnapshotWriter:
+    """
+    スナップショットをリングバッファ経由で受け取り、別スレッドで表示する
+    
+    計測スレッドはpush()するだけで表示（コンソールI/O）を待たない。
+    表示が追いつかない場合は古いスナップショットから破棄される。
+    """
+    
+    def __init__(self, render: Callable[[Snapshot], None], maxlen: int = SNAPSHOT_BUFFER_LEN):
+        self._render = render
+        self._buffer = deque(maxlen=maxlen)
+        self._ready = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+    
+    def start(self) -> None:
+        self._thread.start()
+    
+    def push(self, snapshot: Snapshot) -> None:
+        self._buffer.append(snapshot)
+        self._ready.set()
+    
+    def stop(self, timeout: float = REFRESH_SEC) -> None:
+        """残りのスナップショットを表示してからスレッドを終了"""
+        self._stopping = True
+        self._ready.set()
+        self._thread.join(timeout)
+    
+    def _run(self) -> None:
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            while self._buffer:
+                self._render(self._buffer.popleft())
+            if self._stopping:
+                return
+
+
 class HardwareMonitor:
     """ハードウェア監視のメインクラス"""
     
+    __slots__ = ('pdh_query', 'system_collector', 'gpu_collector', 'npu_collector', '_pool', '_sums', '_cnts',
+                 '_writer', '_npu_available', 'intel_ai_boost_detected', '_gpu_available')
+    
+    # get_gpu_detailed_infoの全体使用率から除外するエンジン（小文字）
+    _OVERALL_EXCLUDE = ("copy",)
+    
     def __init__(self):
-        self.system_collector = SystemCollector()
+        # CPU/GPU/NPUのPDHカウンターは1つのクエリで同時に収集する
+        self.pdh_query = PDHQuery()
+        self.system_collector = SystemCollector(pdh_query=self.pdh_query)
         # GPU監視：Computeエンジンのみを対象とし、Copy/Video/3Dを除外
         self.gpu_collector = PDHCollector(
             r"\GPU Engine(*)\Utilization Percentage",
             include_names=["Compute"],  # Computeエンジンのみを対象
-            exclude_contains=["Copy", "Video", "3D"]  # Copy, Video, 3D系を除外
+            exclude_contains=["Copy", "Video", "3D"],  # Copy, Video, 3D系を除外
+            query=self.pdh_query
         )
-        self.npu_collector = PDHCollector(r"\NPU Engine(*)\Utilization Percentage")
+        self.npu_collector = PDHCollector(r"\NPU Engine(*)\Utilization Percentage", query=self.pdh_query)
+        # PDHの収集（待機を含む）をpsutilの取得と並行させるためのワーカー
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdh-sampler")
         
         # 統計計算用
-        self.averages = {
-            'cpu': RunningAverage(),
-            'memory': RunningAverage(),
-            'gpu': RunningAverage(),
-            'npu': RunningAverage(),
-            'disk_read': RunningAverage(),
-            'disk_write': RunningAverage(),
-            'net_send': RunningAverage(),
-            'net_recv': RunningAverage()
-        }
+        self._sums = [0.0] * N_AVERAGES
+        self._cnts = [0] * N_AVERAGES
+        
+        # 表示スレッド（start_monitoring中のみ有効）
+        self._writer: Optional[SnapshotWriter] = None
         
         # NPU検出情報
-        self.intel_ai_boost_detected = NPUDetector.detect_intel_ai_boost()
+        # PDHのNPUカウンターが使える場合は、重いWMI検出を行わない（None = 未確認）
+        self._npu_available = self.npu_collector.is_available()
+        self.intel_ai_boost_detected: Optional[bool] = (
+            None if self._npu_available else NPUDetector.detect_intel_ai_boost()
+        )
         
         # GPU監視の可用性チェック
         self._gpu_available = self.gpu_collector.is_available()
         if not self._gpu_available:
             print("Warning: GPU Performance Counters not available - GPU monitoring disabled")
     
-    def get_gpu_usage(self) -> Tuple[float, List[Tuple[str, float]]]:
+    def __enter__(self) -> "HardwareMonitor":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """ワーカースレッドとPDHクエリを解放する"""
+        self._pool.shutdown(wait=True)
+        self.system_collector.close()
+        self.gpu_collector.close()
+        self.npu_collector.close()
+        self.pdh_query.close()
+    
+    def get_gpu_usage(self, gpu_data: Optional[Dict[str, float]] = None) -> Tuple[float, List[Tuple[str, float]]]:
         """
         GPU Compute使用率を取得
         
+        Args:
+            gpu_data: 今回のティックで収集済みのGPUデータ（Noneの場合はここで収集する）
+            
         Returns:
             (overall_percent, top_engines): 全体使用率とトップエンジンのリスト
         """
@@ -357,14 +733,17 @@ class HardwareMonitor:
             return (0.0, [])
         
         try:
-            gpu_data = self.gpu_collector.collect()
+            if gpu_data is None:
+                self.pdh_query.sample()
+                gpu_data = self.gpu_collector.collect()
             if not gpu_data:
                 return (0.0, [])
             
             # Compute Engineの使用率を計算
             overall, top = UtilityFunctions.summarize_engine_util(
                 gpu_data, 
-                include_names=["Compute"]  # Computeエンジンのみ
+                include_names=["Compute"],  # Computeエンジンのみ
+                validated=True
             )
             
             # 値を0-100の範囲にクランプ
@@ -377,10 +756,13 @@ class HardwareMonitor:
             print(f"GPU monitoring error: {e}")
             return (0.0, [])
     
-    def get_gpu_detailed_info(self) -> Dict[str, Any]:
+    def get_gpu_detailed_info(self, gpu_data: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
         """
         詳細なGPU利用情報を取得（フロントエンド表示用）
         
+        Args:
+            gpu_data: 今回のティックで収集済みのGPUデータ（Noneの場合はここで収集する）
+            
         Returns:
             GPU利用状況の詳細情報
         """
@@ -396,7 +778,10 @@ class HardwareMonitor:
             }
         
         try:
-            gpu_data = self.gpu_collector.collect()
+            if gpu_data is None:
+                # 監視ループ外から単発で呼ばれた場合は、ここで最新値を収集する
+                self.pdh_query.sample()
+                gpu_data = self.gpu_collector.collect()
             if not gpu_data:
                 return {
                     "available": True,
@@ -408,28 +793,39 @@ class HardwareMonitor:
                     "method": "pdh_no_data"
                 }
             
-            # Compute Engine使用率
-            compute_overall, compute_top = UtilityFunctions.summarize_engine_util(
-                gpu_data,
-                include_names=["Compute"]
-            )
-            
-            # 全体GPU使用率（Copy除く）
-            overall_data = {k: v for k, v in gpu_data.items() 
-                          if not any(exclude.lower() in k.lower() for exclude in ["Copy"])}
-            overall_percent, overall_top = UtilityFunctions.summarize_engine_util(overall_data)
-            
             # 値をクランプ
             def clamp(value: float) -> float:
                 return max(0.0, min(100.0, float(value)))
             
+            # 1回の走査でエンジン一覧（クランプ済み）・Compute最大値・全体用（Copy除く）の候補を作る
+            engines = {}
+            overall_items = []
+            compute_overall = 0.0
+            for name, val in gpu_data.items():
+                engines[name] = clamp(val)
+                if val > compute_overall:
+                    compute_overall = val
+                name_lc = name.lower()
+                for tag in self._OVERALL_EXCLUDE:
+                    if tag in name_lc:
+                        break
+                else:
+                    overall_items.append((name, val))
+            
+            # Compute Engine使用率（最大値）とトップ3
+            compute_top = heapq.nlargest(3, gpu_data.items(), key=_BY_VALUE)
+            
+            # 全体GPU使用率（Copy除く）: 上位5エンジンの平均
+            overall_top = heapq.nlargest(5, overall_items, key=_BY_VALUE)
+            overall_percent = sum(val for _, val in overall_top) / len(overall_top) if overall_top else 0.0
+            
             return {
                 "available": True,
                 "compute_percent": clamp(compute_overall),
                 "overall_percent": clamp(overall_percent),
-                "engines": {name: clamp(val) for name, val in gpu_data.items()},
+                "engines": engines,
                 "top_engines": [(name, clamp(val)) for name, val in overall_top[:3]],
-                "compute_engines": [(name, clamp(val)) for name, val in compute_top[:3]],
+                "compute_engines": [(name, clamp(val)) for name, val in compute_top],
                 "method": "pdh"
             }
             
@@ -448,106 +844,174 @@ class HardwareMonitor:
     def start_monitoring(self):
         """監視開始"""
         self.print_header()
-        NPUDetector.print_npu_status()
+        NPUDetector.print_npu_status(self.intel_ai_boost_detected, self._npu_available)
         
-        psutil.cpu_percent(interval=None)  # CPU priming
+        psutil.cpu_percent(interval=None, percpu=True)  # CPU priming
         
+        # 表示は別スレッドに任せ、このスレッドは計測に専念する
+        self._writer = SnapshotWriter(self.display_metrics)
+        self._writer.start()
+        
+        # 絶対デッドラインで周期を刻み、収集コストによるドリフトを防ぐ
+        next_tick = time.monotonic()
         try:
             while True:
                 self.collect_and_display_metrics()
-                time.sleep(REFRESH_SEC)
+                next_tick += REFRESH_SEC
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # 処理が周期を超過した場合は追いつこうとせず基準をリセット
+                    next_tick = time.monotonic()
         except KeyboardInterrupt:
             pass
+        finally:
+            self._writer.stop()
+            self._writer = None
     
     def collect_and_display_metrics(self):
         """メトリクス収集と表示"""
+        # PDHカウンター（CPU/GPU/NPU）の収集をワーカーで行い、その間にpsutilの値を取得する
+        pdh_future = self._pool.submit(self.pdh_query.sample)
+        io_data = self.system_collector.collect_io()
+        pdh_future.result()
+        
         # システムメトリクス収集
-        sys_data = self.system_collector.collect()
+        sys_data = self.system_collector.collect(io_data)
         gpu_data = self.gpu_collector.collect()
         npu_data = self.npu_collector.collect()
         
+        # GPU/NPUの集計はティックごとに1回だけ行い、統計と表示で使い回す
+        gpu_usage = self.get_gpu_usage(gpu_data)
+        npu_usage = UtilityFunctions.summarize_engine_util(npu_data, validated=True) if npu_data else None
+        
         # 統計更新
-        self.update_averages(sys_data, gpu_data, npu_data)
+        self.update_averages(sys_data, gpu_usage, npu_usage)
+        snapshot = self.build_snapshot(sys_data, gpu_usage, npu_usage)
         
-        # 表示
-        self.display_metrics(sys_data, gpu_data, npu_data)
+        # 表示（表示スレッドがあれば渡すだけ）
+        if self._writer is not None:
+            self._writer.push(snapshot)
+        else:
+            self.display_metrics(snapshot)
     
-    def update_averages(self, sys_data: Dict, gpu_data: Dict, npu_data: Dict):
-        """平均値を更新"""
-        self.averages['cpu'].add(sys_data['cpu_overall'])
-        self.averages['memory'].add(sys_data['memory_percent'])
+    def update_averages(self, sys_data: Dict, gpu_usage: Tuple[float, List[Tuple[str, float]]],
+                        npu_usage: Optional[Tuple[float, List[Tuple[str, float]]]]):
+        """
+        平均値を更新
+        
+        Args:
+            sys_data: SystemCollectorの収集結果
+            gpu_usage: get_gpu_usage()の結果
+            npu_usage: NPUの集計結果（NPUデータが無い場合はNone）
+        """
+        sums = self._sums
+        cnts = self._cnts
+        sums[IDX_CPU] += sys_data['cpu_overall']
+        cnts[IDX_CPU] += 1
+        sums[IDX_MEM] += sys_data['memory_percent']
+        cnts[IDX_MEM] += 1
         
         if sys_data['disk_read_rate'] is not None:
-            self.averages['disk_read'].add(sys_data['disk_read_rate'])
-            self.averages['disk_write'].add(sys_data['disk_write_rate'])
+            sums[IDX_DISK_READ] += sys_data['disk_read_rate']
+            cnts[IDX_DISK_READ] += 1
+            sums[IDX_DISK_WRITE] += sys_data['disk_write_rate']
+            cnts[IDX_DISK_WRITE] += 1
         
         if sys_data['net_send_rate'] is not None:
-            self.averages['net_send'].add(sys_data['net_send_rate'])
-            self.averages['net_recv'].add(sys_data['net_recv_rate'])
+            sums[IDX_NET_SEND] += sys_data['net_send_rate']
+            cnts[IDX_NET_SEND] += 1
+            sums[IDX_NET_RECV] += sys_data['net_recv_rate']
+            cnts[IDX_NET_RECV] += 1
         
         # 改良されたGPU使用率計算を使用
         if self._gpu_available:
-            gpu_overall, _ = self.get_gpu_usage()
-            self.averages['gpu'].add(gpu_overall)
-        
-        if npu_data:
-            npu_overall, _ = UtilityFunctions.summarize_engine_util(npu_data)
-            self.averages['npu'].add(npu_overall)
-    
-    def display_metrics(self, sys_data: Dict, gpu_data: Dict, npu_data: Dict):
-        """メトリクス表示"""
-        print("\n" + "-"*78)
-        
-        # CPU
-        cpu_avg = f"{self.averages['cpu'].average():5.1f}%" if self.averages['cpu'].has_samples() else "  n/a"
-        cpu_cores = ", ".join(f"{p:4.0f}%" for p in sys_data['cpu_per_core'])
-        print(f"CPU   : avg {cpu_avg} | curr {sys_data['cpu_overall']:5.1f}% | per-core: {cpu_cores}")
-        
-        # Memory
-        mem_avg = f"{self.averages['memory'].average():5.1f}%" if self.averages['memory'].has_samples() else "  n/a"
-        mem_used = UtilityFunctions.human_bytes(sys_data['memory_used'])
-        mem_total = UtilityFunctions.human_bytes(sys_data['memory_total'])
-        print(f"Memory: avg {mem_avg} | curr {sys_data['memory_percent']:5.1f}% ({mem_used}/{mem_total})")
-        
-        # Disk
-        disk_avg = self.format_disk_net_avg('disk')
-        disk_curr = self.format_disk_curr(sys_data['disk_read_rate'], sys_data['disk_write_rate'])
-        print(f"Disk  : avg {disk_avg} | curr {disk_curr}")
-        
-        # Network
-        net_avg = self.format_disk_net_avg('net')
-        net_curr = self.format_net_curr(sys_data['net_send_rate'], sys_data['net_recv_rate'])
-        print(f"Net   : avg {net_avg} | curr {net_curr}")
-        
-        # GPU - 改良されたGPU監視を使用
-        if self._gpu_available:
-            gpu_overall, gpu_top = self.get_gpu_usage()
-            gpu_avg = f"{self.averages['gpu'].average():5.1f}%" if self.averages['gpu'].has_samples() else "  n/a"
-            gpu_curr = f"{gpu_overall:5.1f}%"
-            gpu_top_str = UtilityFunctions.format_top_list(gpu_top) if gpu_top else "n/a"
-            print(f"GPUComp: avg {gpu_avg} | curr {gpu_curr} | top {gpu_top_str}")
+            sums[IDX_GPU] += gpu_usage[0]
+            cnts[IDX_GPU] += 1
+        
+        if npu_usage is not None:
+            sums[IDX_NPU] += npu_usage[0]
+            cnts[IDX_NPU] += 1
+    
+    def build_snapshot(self, sys_data: Dict, gpu_usage: Tuple[float, List[Tuple[str, float]]],
+                       npu_usage: Optional[Tuple[float, List[Tuple[str, float]]]]) -> Snapshot:
+        """表示に必要な値をすべて計算済みのスナップショットにまとめる"""
+        sums = self._sums
+        cnts = self._cnts
+        
+        def avg(idx: int) -> Optional[float]:
+            return sums[idx] / cnts[idx] if cnts[idx] else None
+        
+        gpu_overall, gpu_top = gpu_usage
+        npu_overall, npu_top = npu_usage if npu_usage is not None else (0.0, [])
+        
+        return Snapshot(
+            timestamp=time.monotonic(),
+            cpu_overall=sys_data['cpu_overall'],
+            cpu_per_core=tuple(sys_data['cpu_per_core']),
+            memory_percent=sys_data['memory_percent'],
+            memory_used=sys_data['memory_used'],
+            memory_total=sys_data['memory_total'],
+            disk_read_rate=sys_data['disk_read_rate'],
+            disk_write_rate=sys_data['disk_write_rate'],
+            net_send_rate=sys_data['net_send_rate'],
+            net_recv_rate=sys_data['net_recv_rate'],
+            gpu_available=self._gpu_available,
+            gpu_overall=gpu_overall,
+            gpu_top=tuple(gpu_top),
+            npu_has_data=npu_usage is not None,
+            npu_overall=npu_overall,
+            npu_top=tuple(npu_top),
+            cpu_avg=avg(IDX_CPU),
+            memory_avg=avg(IDX_MEM),
+            disk_read_avg=avg(IDX_DISK_READ),
+            disk_write_avg=avg(IDX_DISK_WRITE),
+            net_send_avg=avg(IDX_NET_SEND),
+            net_recv_avg=avg(IDX_NET_RECV),
+            gpu_avg=avg(IDX_GPU),
+            npu_avg=avg(IDX_NPU),
+        )
+    
+    def display_metrics(self, snap: Snapshot):
+        """メトリクス表示（1フレームをまとめて1回で書き出す）"""
+        cpu_cores = _percore_format(len(snap.cpu_per_core)) % snap.cpu_per_core
+        mem_used = UtilityFunctions.human_bytes(snap.memory_used)
+        mem_total = UtilityFunctions.human_bytes(snap.memory_total)
+        
+        lines = [
+            _SEPARATOR,
+            _CPU_FMT.format(_format_pct(snap.cpu_avg), snap.cpu_overall, cpu_cores),
+            _MEM_FMT.format(_format_pct(snap.memory_avg), snap.memory_percent, mem_used, mem_total),
+            _DISK_FMT.format(
+                self.format_disk_net_avg("R", snap.disk_read_avg, snap.disk_write_avg),
+                self.format_disk_curr(snap.disk_read_rate, snap.disk_write_rate)),
+            _NET_FMT.format(
+                self.format_disk_net_avg("S", snap.net_send_avg, snap.net_recv_avg),
+                self.format_net_curr(snap.net_send_rate, snap.net_recv_rate)),
+        ]
+        
+        # GPU
+        if snap.gpu_available:
+            gpu_top_str = UtilityFunctions.format_top_list(snap.gpu_top) if snap.gpu_top else "n/a"
+            lines.append(_GPU_FMT.format(_format_pct(snap.gpu_avg), snap.gpu_overall, gpu_top_str))
         else:
-            print("GPUComp: n/a (counters not available)")
+            lines.append(_GPU_NA)
         
         # NPU
-        npu_overall, npu_top = UtilityFunctions.summarize_engine_util(npu_data)
-        npu_status = self.format_npu_status(npu_overall)
-        npu_avg = f"{self.averages['npu'].average():5.1f}%" if self.averages['npu'].has_samples() else "  n/a"
-        npu_curr = f"{npu_overall:5.1f}%" if npu_data else "  n/a"
-        npu_top_str = UtilityFunctions.format_top_list(npu_top) if npu_top else "n/a"
-        print(f"NPU   : avg {npu_avg} | curr {npu_curr} | top {npu_top_str}{npu_status}")
-    
-    def format_disk_net_avg(self, type_name: str) -> str:
-        """ディスク/ネットワークの平均値をフォーマット"""
-        if type_name == 'disk':
-            read_avg, write_avg = self.averages['disk_read'], self.averages['disk_write']
-            prefix = "R"
-        else:
-            read_avg, write_avg = self.averages['net_send'], self.averages['net_recv']
-            prefix = "S"
+        npu_curr = f"{snap.npu_overall:5.1f}%" if snap.npu_has_data else "  n/a"
+        npu_top_str = UtilityFunctions.format_top_list(snap.npu_top) if snap.npu_top else "n/a"
+        lines.append(_NPU_FMT.format(
+            _format_pct(snap.npu_avg), npu_curr, npu_top_str, self.format_npu_status(snap.npu_overall)))
         
-        if read_avg.has_samples():
-            return f"{prefix} {UtilityFunctions.human_bytes_per_s(read_avg.average())} W {UtilityFunctions.human_bytes_per_s(write_avg.average())}"
+        lines.append("")
+        sys.stdout.write("\n".join(lines))
+        sys.stdout.flush()
+    
+    def format_disk_net_avg(self, prefix: str, first_avg: Optional[float], second_avg: Optional[float]) -> str:
+        """ディスク/ネットワークの平均値をフォーマット"""
+        if first_avg is not None:
+            return f"{prefix} {UtilityFunctions.human_bytes_per_s(first_avg)} W {UtilityFunctions.human_bytes_per_s(second_avg)}"
         return "n/a"
     
     def format_disk_curr(self, read_rate: Optional[float], write_rate: Optional[float]) -> str:
@@ -564,7 +1028,7 @@ class HardwareMonitor:
     
     def format_npu_status(self, npu_overall: float) -> str:
         """NPUステータスをフォーマット"""
-        if npu_overall > 0:
+        if npu_overall > 0 or self._npu_available:
             return ""
         elif self.intel_ai_boost_detected:
             return " (Intel AI Boost detected, no PDH counter)"
@@ -579,5 +1043,5 @@ class HardwareMonitor:
         print("Ctrl+C to stop\n")
 
 if __name__ == "__main__":
-    monitor = HardwareMonitor()
-    monitor.start_monitoring()
+    with HardwareMonitor() as monitor:
+        monitor.start_monitoring()
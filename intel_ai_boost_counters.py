@@ -4,22 +4,78 @@ Intel AI Boost NPU Performance Counters 調査スクリプト
 win32pdhを使用してIntel AI Boost NPUで利用可能なコレクタ一覧を表示
 """
 
-import subprocess
+import functools
+import re
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 # ----- Dependencies -----
-try:
-    import win32pdh
-    HAS_PDH = True
-except ImportError:
-    HAS_PDH = False
+# pywin32 / wmi の読み込みは重いため、実際に使う時点まで遅延させる
+win32pdh = None
+wmi = None
 
-try:
-    import wmi
-    HAS_WMI = True
-except ImportError:
-    HAS_WMI = False
+@functools.lru_cache(maxsize=1)
+def _load_pdh() -> bool:
+    """win32pdhを遅延インポートし、利用可能かどうかを返す"""
+    global win32pdh
+    try:
+        import win32pdh as module
+    except ImportError:
+        return False
+    win32pdh = module
+    return True
+
+@functools.lru_cache(maxsize=1)
+def _load_wmi() -> bool:
+    """wmiを遅延インポートし、利用可能かどうかを返す"""
+    global wmi
+    try:
+        import wmi as module
+    except ImportError:
+        return False
+    wmi = module
+    return True
+
+@functools.lru_cache(maxsize=None)
+def _expand_counter_path(pattern: str) -> Tuple[str, ...]:
+    """ExpandCounterPathの結果をパターン単位でキャッシュ（PDH呼び出しは重いため）"""
+    try:
+        paths = win32pdh.ExpandCounterPath(pattern)
+        return tuple(paths) if paths else ()
+    except Exception:
+        return ()
+
+@functools.lru_cache(maxsize=1)
+def _query_intel_ai_boost() -> bool:
+    """WMIでIntel AI Boostデバイスを検索（実行中に変わらないため結果をキャッシュ）"""
+    try:
+        c = wmi.WMI()
+        # 全PnPデバイスを列挙せず、WMI側で名前を絞り込む
+        return bool(c.query("SELECT Name FROM Win32_PnPEntity WHERE Name LIKE '%Intel(R) AI Boost%'"))
+    except Exception:
+        return False
+
+# カウンタの分類ルール（先に書いたカテゴリが優先）
+# 各選択肢は行頭で先読みするだけなので、1回のsearchで優先順位どおりのカテゴリが決まる
+_CATEGORY_RE = re.compile(
+    r'^(?:'
+    r'(?P<npu_engine>(?=.*npu engine))'
+    r'|(?P<gpu_engine>(?=.*gpu engine)(?=.*(?:ai|neural|npu)))'
+    r'|(?P<processor>(?=.*processor))'
+    r'|(?P<memory>(?=.*memory))'
+    r'|(?P<thermal>(?=.*thermal))'
+    r'|(?P<power>(?=.*power))'
+    r')',
+    re.IGNORECASE | re.DOTALL
+)
+_CATEGORY_LABELS = {
+    'npu_engine': 'NPU Engine',
+    'gpu_engine': 'GPU Engine',
+    'processor': 'Processor',
+    'memory': 'Memory',
+    'thermal': 'Thermal',
+    'power': 'Power',
+}
 
 class IntelAIBoostCounterInvestigator:
     """Intel AI Boost NPU専用のパフォーマンスカウンタ調査クラス"""
@@ -27,51 +83,51 @@ class IntelAIBoostCounterInvestigator:
     def __init__(self):
         self.ai_boost_detected = self._detect_intel_ai_boost()
         self.available_counters = []
-        self.counter_patterns = [
-            # NPU関連の基本パターン
-            r"\NPU Engine(*)\*",
-            r"\NPU Engine(*)\Utilization Percentage",
-            r"\NPU Process Memory(*)\*",
-            r"\NPU Adapter Memory(*)\*",
-            
-            # Intel AI Boost専用パターン
-            r"\Intel AI Boost(*)\*",
-            r"\AI Boost(*)\*",
-            r"\Intel(R) AI Boost(*)\*",
-            r"\Neural Processing Unit(*)\*",
-            r"\Neural Engine(*)\*",
-            r"\AI Processing Unit(*)\*",
-            r"\AI Accelerator(*)\*",
-            
-            # プロセッサー情報内のNPU関連
-            r"\Processor Information(*)\*AI*",
-            r"\Processor Information(*)\*Neural*",
-            r"\Processor Information(*)\*NPU*",
-            
-            # GPU Engine内のNPU関連（統合デバイスの可能性）
-            r"\GPU Engine(*)\*AI*",
-            r"\GPU Engine(*)\*Neural*",
-            r"\GPU Engine(*)\*NPU*",
-            
-            # システムレベルの電力・温度（NPU関連）
-            r"\Thermal Zone Information(*)\*",
-            r"\Power Meter(*)\*",
+        # 具体的なパターンから順に段階分けする。tier1（NPU/AI Boost専用）で
+        # カウンタが見つかった場合は、広範囲に展開されるtier4（電力・温度）を省略する
+        self.counter_pattern_tiers = [
+            [
+                # NPU関連の基本パターン
+                r"\NPU Engine(*)\*",
+                r"\NPU Engine(*)\Utilization Percentage",
+                r"\NPU Process Memory(*)\*",
+                r"\NPU Adapter Memory(*)\*",
+                
+                # Intel AI Boost専用パターン
+                r"\Intel AI Boost(*)\*",
+                r"\AI Boost(*)\*",
+                r"\Intel(R) AI Boost(*)\*",
+            ],
+            [
+                r"\Neural Processing Unit(*)\*",
+                r"\Neural Engine(*)\*",
+                r"\AI Processing Unit(*)\*",
+                r"\AI Accelerator(*)\*",
+            ],
+            [
+                # プロセッサー情報内のNPU関連
+                r"\Processor Information(*)\*AI*",
+                r"\Processor Information(*)\*Neural*",
+                r"\Processor Information(*)\*NPU*",
+                
+                # GPU Engine内のNPU関連（統合デバイスの可能性）
+                r"\GPU Engine(*)\*AI*",
+                r"\GPU Engine(*)\*Neural*",
+                r"\GPU Engine(*)\*NPU*",
+            ],
+            [
+                # システムレベルの電力・温度（NPU関連）
+                r"\Thermal Zone Information(*)\*",
+                r"\Power Meter(*)\*",
+            ],
         ]
+        self.counter_patterns = [pattern for tier in self.counter_pattern_tiers for pattern in tier]
     
     def _detect_intel_ai_boost(self) -> bool:
         """Intel AI Boost NPUの存在確認"""
-        if not HAS_WMI:
+        if not _load_wmi():
             return False
-        
-        try:
-            c = wmi.WMI()
-            for device in c.Win32_PnPEntity():
-                device_name = str(getattr(device, 'Name', ''))
-                if 'Intel(R) AI Boost' in device_name:
-                    return True
-        except Exception:
-            pass
-        return False
+        return _query_intel_ai_boost()
     
     def investigate_pdh_counters(self):
         """PDHカウンタの詳細調査"""
@@ -86,10 +142,11 @@ class IntelAIBoostCounterInvestigator:
             print("✗ Intel AI Boost NPU: NOT DETECTED")
             print("  Warning: This investigation may not find NPU-specific counters")
         
-        print(f"✓ win32pdh: {'Available' if HAS_PDH else 'NOT Available'}")
+        has_pdh = _load_pdh()
+        print(f"✓ win32pdh: {'Available' if has_pdh else 'NOT Available'}")
         print()
         
-        if not HAS_PDH:
+        if not has_pdh:
             print("ERROR: win32pdh is not available. Please install pywin32:")
             print("  pip install pywin32")
             return
@@ -98,25 +155,39 @@ class IntelAIBoostCounterInvestigator:
         print("Investigating Performance Counter Patterns...")
         print("-" * 60)
         
-        all_found_counters = []
+        # 重複を除きつつ発見順を保つ（サンプリング対象の先頭5個を安定させる）
+        all_found_counters: Dict[str, None] = {}
         
-        for pattern in self.counter_patterns:
-            print(f"\nPattern: {pattern}")
-            found_counters = self._expand_counter_pattern(pattern)
+        tier1_found = False
+        last_tier = len(self.counter_pattern_tiers) - 1
+        for tier_index, tier in enumerate(self.counter_pattern_tiers):
+            if tier_index == last_tier and tier1_found:
+                print(f"\nSkipping fallback patterns ({len(tier)}): NPU-specific counters already found")
+                break
             
-            if found_counters:
-                print(f"  ✓ Found {len(found_counters)} counters:")
-                for counter in found_counters[:10]:  # 最初の10個のみ表示
-                    print(f"    {counter}")
-                if len(found_counters) > 10:
-                    print(f"    ... and {len(found_counters) - 10} more")
+            for pattern in tier:
+                print(f"\nPattern: {pattern}")
+                # 同じオブジェクトの `\*` パターンに含まれる場合は展開しない（結果の和集合は同じ）
+                covering = self._covering_pattern(pattern)
+                if covering:
+                    print(f"  - Covered by {covering}")
+                    continue
+                found_counters = self._expand_counter_pattern(pattern)
                 
-                all_found_counters.extend(found_counters)
-            else:
-                print("  ✗ No counters found")
+                if found_counters:
+                    print(f"  ✓ Found {len(found_counters)} counters:")
+                    for counter in found_counters[:10]:  # 最初の10個のみ表示
+                        print(f"    {counter}")
+                    if len(found_counters) > 10:
+                        print(f"    ... and {len(found_counters) - 10} more")
+                    
+                    all_found_counters.update(dict.fromkeys(found_counters))
+                    if tier_index == 0:
+                        tier1_found = True
+                else:
+                    print("  ✗ No counters found")
         
-        # 重複除去
-        unique_counters = list(set(all_found_counters))
+        unique_counters = list(all_found_counters)
         
         print(f"\n{'='*60}")
         print(f" Summary: Found {len(unique_counters)} unique counters")
@@ -128,45 +199,68 @@ class IntelAIBoostCounterInvestigator:
             print("No NPU-related performance counters found.")
             self._suggest_alternatives()
     
-    def _expand_counter_pattern(self, pattern: str) -> List[str]:
+    def _covering_pattern(self, pattern: str) -> Optional[str]:
+        """patternを包含する `\\Object(*)\\*` パターンがcounter_patternsにあれば返す"""
+        obj, _, counter = pattern.rpartition('\\')
+        if counter == '*':
+            return None
+        wildcard = obj + '\\*'
+        return wildcard if wildcard in self.counter_patterns else None
+    
+    def _expand_counter_pattern(self, pattern: str) -> Tuple[str, ...]:
         """パフォーマンスカウンタパターンを展開"""
-        try:
-            paths = win32pdh.ExpandCounterPath(pattern)
-            return list(paths) if paths else []
-        except Exception as e:
-            return []
+        return _expand_counter_path(pattern)
     
     def _test_counter_sampling(self, counters: List[str]):
         """カウンタからのサンプリングテスト"""
         print(f"\nTesting Counter Sampling (first 5 counters)...")
         print("-" * 50)
         
-        for counter_path in counters:
-            print(f"\nTesting: {counter_path}")
-            success = self._test_single_counter(counter_path)
-            if success:
-                print("  ✓ Sampling successful")
-            else:
-                print("  ✗ Sampling failed")
-    
-    def _test_single_counter(self, counter_path: str) -> bool:
-        """単一カウンタのサンプリングテスト"""
         try:
             query = win32pdh.OpenQuery()
-            counter = win32pdh.AddCounter(query, counter_path)
-            
-            # 初回収集
-            win32pdh.CollectQueryData(query)
-            time.sleep(0.5)  # 0.5秒待機
+        except Exception as e:
+            print(f"  Error opening query: {e}")
+            return
+        
+        try:
+            # 全カウンタを1つのクエリに登録し、待機は全体で1回だけにする
+            handles = {}
+            add_errors = {}
+            for counter_path in counters:
+                try:
+                    handles[counter_path] = win32pdh.AddCounter(query, counter_path)
+                except Exception as e:
+                    add_errors[counter_path] = e
             
-            # 2回目収集
-            win32pdh.CollectQueryData(query)
+            if handles:
+                # 初回収集
+                win32pdh.CollectQueryData(query)
+                time.sleep(0.5)  # 0.5秒待機
+                
+                # 2回目収集
+                win32pdh.CollectQueryData(query)
             
-            # 値取得
+            for counter_path in counters:
+                print(f"\nTesting: {counter_path}")
+                if counter_path in add_errors:
+                    print(f"    Error: {add_errors[counter_path]}")
+                    success = False
+                else:
+                    success = self._test_single_counter(handles[counter_path])
+                if success:
+                    print("  ✓ Sampling successful")
+                else:
+                    print("  ✗ Sampling failed")
+        except Exception as e:
+            print(f"  Error during sampling: {e}")
+        finally:
+            win32pdh.CloseQuery(query)
+    
+    def _test_single_counter(self, counter) -> bool:
+        """収集済みクエリから単一カウンタの値を取得"""
+        try:
             t, val = win32pdh.GetFormattedCounterValue(counter, win32pdh.PDH_FMT_DOUBLE)
             print(f"    Value: {val}")
-            
-            win32pdh.CloseQuery(query)
             return True
             
         except Exception as e:
@@ -187,28 +281,27 @@ class IntelAIBoostCounterInvestigator:
         print("Searching all performance counters for NPU/AI keywords...")
         print("This may take a moment...\n")
         
+        if not _load_pdh():
+            print("win32pdh is not available - skipping comprehensive search")
+            return
+        
         try:
-            # typeperfコマンドで全カウンタリストを取得
-            result = subprocess.run(
-                ['typeperf', '-q'], 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"Error running typeperf: {result.stderr}")
-                return
-            
-            all_counters = result.stdout.split('\n')
+            # typeperfを起動せず、PDHから直接全カウンタリストを取得
+            all_counters = self._enumerate_all_counters()
             print(f"Total counters found: {len(all_counters)}")
             
-            # キーワード検索
-            matched_counters = []
-            for keyword in keywords:
+            # 全キーワードを1つの正規表現にまとめ、全カウンタを1回だけ走査する
+            keyword_re = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+            candidates = [counter for counter in all_counters if keyword_re.search(counter)]
+            
+            # キーワード別の内訳は、一致したカウンタだけを対象に集計
+            # （小文字化はカウンタ・キーワードともに1回だけ行う）
+            keywords_lc = [keyword.lower() for keyword in keywords]
+            candidates_lc = [(counter, counter.lower()) for counter in candidates]
+            for keyword, keyword_lc in zip(keywords, keywords_lc):
                 keyword_matches = [
-                    counter for counter in all_counters 
-                    if keyword.lower() in counter.lower() and counter.strip()
+                    counter for counter, counter_lc in candidates_lc 
+                    if keyword_lc in counter_lc
                 ]
                 
                 if keyword_matches:
@@ -217,13 +310,11 @@ class IntelAIBoostCounterInvestigator:
                         print(f"  {match}")
                     if len(keyword_matches) > 5:
                         print(f"  ... and {len(keyword_matches) - 5} more")
-                    
-                    matched_counters.extend(keyword_matches)
                 else:
                     print(f"Keyword '{keyword}': No matches")
             
-            # 重複除去
-            unique_matches = list(set(matched_counters))
+            # いずれかのキーワードに一致したカウンタ = 正規表現の一致結果（順序を保って重複除去）
+            unique_matches = list(dict.fromkeys(candidates))
             
             if unique_matches:
                 print(f"\nTotal unique AI/NPU related counters: {len(unique_matches)}")
@@ -231,35 +322,33 @@ class IntelAIBoostCounterInvestigator:
             else:
                 print("\nNo AI/NPU related counters found in comprehensive search.")
                 
-        except subprocess.TimeoutExpired:
-            print("Timeout occurred while listing counters")
-        except FileNotFoundError:
-            print("typeperf command not found")
         except Exception as e:
             print(f"Error in comprehensive search: {e}")
     
+    def _enumerate_all_counters(self) -> List[str]:
+        """PDHのオブジェクト/カウンタを列挙して `\\Object(*)\\Counter` 形式のリストを返す"""
+        counters = []
+        objects = win32pdh.EnumObjects(None, None, win32pdh.PERF_DETAIL_WIZARD, True)
+        for obj in objects:
+            try:
+                items, instances = win32pdh.EnumObjectItems(None, None, obj, win32pdh.PERF_DETAIL_WIZARD)
+            except Exception:
+                continue
+            prefix = f"\\{obj}(*)\\" if instances else f"\\{obj}\\"
+            counters.extend(prefix + item for item in items)
+        return counters
+    
     def _analyze_matched_counters(self, counters: List[str]):
         """マッチしたカウンタの分析"""
         print(f"\nAnalyzing matched counters...")
         print("-" * 40)
         
-        # カテゴリ別に分類
-        categories = {
-            'NPU Engine': [c for c in counters if 'npu engine' in c.lower()],
-            'GPU Engine': [c for c in counters if 'gpu engine' in c.lower() and any(kw in c.lower() for kw in ['ai', 'neural', 'npu'])],
-            'Processor': [c for c in counters if 'processor' in c.lower()],
-            'Memory': [c for c in counters if 'memory' in c.lower()],
-            'Thermal': [c for c in counters if 'thermal' in c.lower()],
-            'Power': [c for c in counters if 'power' in c.lower()],
-            'Other': []
-        }
-        
-        # その他カテゴリに分類されないものを追加
-        categorized = set()
-        for cat_counters in categories.values():
-            categorized.update(cat_counters)
-        
-        categories['Other'] = [c for c in counters if c not in categorized]
+        # カテゴリ別に分類（1回の走査で、どのカテゴリにも当たらないものはOtherへ）
+        categories = {label: [] for label in _CATEGORY_LABELS.values()}
+        categories['Other'] = []
+        for c in counters:
+            m = _CATEGORY_RE.search(c)
+            categories[_CATEGORY_LABELS[m.lastgroup] if m else 'Other'].append(c)
         
         for category, cat_counters in categories.items():
             if cat_counters:
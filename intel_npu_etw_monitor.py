@@ -4,12 +4,262 @@ Intel NPU ETW監視テストスクリプト
 発見されたIntel NPU ETWプロバイダーを実際に使用してテスト
 """
 
+import ctypes
 import subprocess
+import sys
+import threading
 import time
+import math
 import os
 import json
+import locale
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+# ----- Dependencies -----
+try:
+    _advapi32 = ctypes.WinDLL('advapi32')
+    HAS_ETW_API = True
+except (AttributeError, OSError):
+    HAS_ETW_API = False
+
+try:
+    _tdh = ctypes.WinDLL('tdh')
+    HAS_TDH_API = True
+except (AttributeError, OSError):
+    HAS_TDH_API = False
+
+# ----- ETW API (evntrace.h) -----
+ERROR_SUCCESS = 0
+ERROR_INSUFFICIENT_BUFFER = 122
+WNODE_FLAG_TRACED_GUID = 0x00020000
+EVENT_TRACE_FILE_MODE_SEQUENTIAL = 0x00000001
+EVENT_TRACE_CONTROL_STOP = 1
+EVENT_CONTROL_CODE_ENABLE_PROVIDER = 1
+TRACE_LEVEL_VERBOSE = 5
+ETW_BUFFER_TYPE_HEADER = 4
+
+# カウントダウン表示（書式は一度だけ組み立て、COUNTDOWN_STEP秒ごとに更新）
+_COUNTDOWN_FMT = "\r⏱ Monitoring... %02ds remaining"
+COUNTDOWN_STEP = 5
+
+class GUID(ctypes.Structure):
+    _fields_ = [
+        ("Data1", ctypes.c_uint32),
+        ("Data2", ctypes.c_uint16),
+        ("Data3", ctypes.c_uint16),
+        ("Data4", ctypes.c_ubyte * 8),
+    ]
+    
+    @classmethod
+    def from_string(cls, text: str) -> "GUID":
+        return cls.from_buffer_copy(uuid.UUID(text).bytes_le)
+
+class WNODE_HEADER(ctypes.Structure):
+    _fields_ = [
+        ("BufferSize", ctypes.c_uint32),
+        ("ProviderId", ctypes.c_uint32),
+        ("HistoricalContext", ctypes.c_uint64),
+        ("TimeStamp", ctypes.c_int64),
+        ("Guid", GUID),
+        ("ClientContext", ctypes.c_uint32),
+        ("Flags", ctypes.c_uint32),
+    ]
+
+class EVENT_TRACE_PROPERTIES(ctypes.Structure):
+    _fields_ = [
+        ("Wnode", WNODE_HEADER),
+        ("BufferSize", ctypes.c_uint32),
+        ("MinimumBuffers", ctypes.c_uint32),
+        ("MaximumBuffers", ctypes.c_uint32),
+        ("MaximumFileSize", ctypes.c_uint32),
+        ("LogFileMode", ctypes.c_uint32),
+        ("FlushTimer", ctypes.c_uint32),
+        ("EnableFlags", ctypes.c_uint32),
+        ("AgeLimit", ctypes.c_int32),
+        ("NumberOfBuffers", ctypes.c_uint32),
+        ("FreeBuffers", ctypes.c_uint32),
+        ("EventsLost", ctypes.c_uint32),
+        ("BuffersWritten", ctypes.c_uint32),
+        ("LogBuffersLost", ctypes.c_uint32),
+        ("RealTimeBuffersLost", ctypes.c_uint32),
+        ("LoggerThreadId", ctypes.c_void_p),
+        ("LogFileNameOffset", ctypes.c_uint32),
+        ("LoggerNameOffset", ctypes.c_uint32),
+    ]
+
+class TraceProperties(ctypes.Structure):
+    """EVENT_TRACE_PROPERTIESの直後にセッション名とファイル名の領域を確保したもの"""
+    _fields_ = [
+        ("Properties", EVENT_TRACE_PROPERTIES),
+        ("LoggerName", ctypes.c_wchar * 1024),
+        ("LogFileName", ctypes.c_wchar * 1024),
+    ]
+
+class TRACE_PROVIDER_INFO(ctypes.Structure):
+    _fields_ = [
+        ("ProviderGuid", GUID),
+        ("SchemaSource", ctypes.c_uint32),
+        ("ProviderNameOffset", ctypes.c_uint32),
+    ]
+
+# PROVIDER_ENUMERATION_INFOのヘッダー（NumberOfProviders, Reserved）の後にTRACE_PROVIDER_INFOの配列が続く
+_PROVIDER_ENUMERATION_HEADER_SIZE = 8
+
+if HAS_TDH_API:
+    _tdh.TdhEnumerateProviders.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+    _tdh.TdhEnumerateProviders.restype = ctypes.c_uint32
+
+def enumerate_registered_providers() -> Optional[set]:
+    """
+    TdhEnumerateProvidersで登録済みのETWプロバイダーGUIDを取得
+    
+    Returns:
+        大文字・波括弧なしのGUID文字列の集合。TDHが使えない場合はNone
+    """
+    if not HAS_TDH_API:
+        return None
+    
+    size = ctypes.c_uint32(0)
+    buffer = None
+    status = _tdh.TdhEnumerateProviders(None, ctypes.byref(size))
+    while status == ERROR_INSUFFICIENT_BUFFER:
+        buffer = ctypes.create_string_buffer(size.value)
+        status = _tdh.TdhEnumerateProviders(buffer, ctypes.byref(size))
+    if status != ERROR_SUCCESS or buffer is None:
+        return None
+    
+    count = ctypes.c_uint32.from_buffer(buffer).value
+    infos = (TRACE_PROVIDER_INFO * count).from_buffer(buffer, _PROVIDER_ENUMERATION_HEADER_SIZE)
+    return {str(uuid.UUID(bytes_le=bytes(info.ProviderGuid))).upper() for info in infos}
+
+if HAS_ETW_API:
+    _advapi32.StartTraceW.argtypes = [ctypes.POINTER(ctypes.c_uint64), ctypes.c_wchar_p, ctypes.POINTER(TraceProperties)]
+    _advapi32.StartTraceW.restype = ctypes.c_uint32
+    _advapi32.EnableTraceEx2.argtypes = [
+        ctypes.c_uint64, ctypes.POINTER(GUID), ctypes.c_uint32, ctypes.c_ubyte,
+        ctypes.c_uint64, ctypes.c_uint64, ctypes.c_uint32, ctypes.c_void_p
+    ]
+    _advapi32.EnableTraceEx2.restype = ctypes.c_uint32
+    _advapi32.ControlTraceW.argtypes = [ctypes.c_uint64, ctypes.c_wchar_p, ctypes.POINTER(TraceProperties), ctypes.c_uint32]
+    _advapi32.ControlTraceW.restype = ctypes.c_uint32
+
+class ETWSessionController:
+    """advapi32のETW APIでトレースセッションを直接制御（logmanプロセスを起動しない）"""
+    
+    def __init__(self):
+        # セッション名 -> TRACEHANDLE
+        self._handles: Dict[str, int] = {}
+    
+    @staticmethod
+    def _new_properties(trace_file: Optional[str] = None) -> TraceProperties:
+        props = TraceProperties()
+        p = props.Properties
+        p.Wnode.BufferSize = ctypes.sizeof(props)
+        p.Wnode.Flags = WNODE_FLAG_TRACED_GUID
+        p.Wnode.ClientContext = 1  # QueryPerformanceCounterのタイムスタンプ
+        p.LoggerNameOffset = TraceProperties.LoggerName.offset
+        p.LogFileNameOffset = TraceProperties.LogFileName.offset
+        if trace_file:
+            p.LogFileMode = EVENT_TRACE_FILE_MODE_SEQUENTIAL
+            props.LogFileName = os.path.abspath(trace_file)
+        return props
+    
+    @staticmethod
+    def _error_message(status: int) -> str:
+        return f"{ctypes.FormatError(status)} (error {status})"
+    
+    def start(self, session_name: str, trace_file: str,
+              min_buffers: int = 0, max_buffers: int = 0) -> Tuple[bool, str]:
+        """StartTraceWでファイル出力のセッションを作成"""
+        props = self._new_properties(trace_file)
+        props.Properties.MinimumBuffers = min_buffers
+        props.Properties.MaximumBuffers = max_buffers
+        handle = ctypes.c_uint64(0)
+        status = _advapi32.StartTraceW(ctypes.byref(handle), session_name, ctypes.byref(props))
+        if status != ERROR_SUCCESS:
+            return (False, self._error_message(status))
+        self._handles[session_name] = handle.value
+        return (True, "")
+    
+    def enable_provider(self, session_name: str, provider_guid: str) -> Tuple[bool, str]:
+        """EnableTraceEx2でプロバイダーをセッションに追加"""
+        handle = self._handles.get(session_name)
+        if handle is None:
+            return (False, f"Session {session_name} was not started by this process")
+        guid = GUID.from_string(provider_guid)
+        status = _advapi32.EnableTraceEx2(handle, ctypes.byref(guid), EVENT_CONTROL_CODE_ENABLE_PROVIDER,
+                                          TRACE_LEVEL_VERBOSE, 0, 0, 0, None)
+        if status != ERROR_SUCCESS:
+            return (False, self._error_message(status))
+        return (True, "")
+    
+    def stop(self, session_name: str) -> Tuple[bool, str]:
+        """ControlTraceWでセッションを停止（ハンドルが無い場合は名前で停止）"""
+        props = self._new_properties()
+        handle = self._handles.pop(session_name, 0)
+        status = _advapi32.ControlTraceW(handle, session_name, ctypes.byref(props), EVENT_TRACE_CONTROL_STOP)
+        if status != ERROR_SUCCESS:
+            return (False, self._error_message(status))
+        return (True, "")
+
+class WMI_BUFFER_HEADER(ctypes.Structure):
+    """ETLファイル内の各バッファ先頭にあるヘッダー（72バイト）"""
+    _fields_ = [
+        ("BufferSize", ctypes.c_uint32),
+        ("SavedOffset", ctypes.c_uint32),
+        ("CurrentOffset", ctypes.c_uint32),
+        ("ReferenceCount", ctypes.c_int32),
+        ("TimeStamp", ctypes.c_int64),
+        ("SequenceNumber", ctypes.c_int64),
+        ("ClockType", ctypes.c_uint64),
+        ("ClientContext", ctypes.c_uint32),
+        ("State", ctypes.c_uint32),
+        ("Offset", ctypes.c_uint32),
+        ("BufferFlag", ctypes.c_uint16),
+        ("BufferType", ctypes.c_uint16),
+        ("Reserved", ctypes.c_uint32 * 4),
+    ]
+
+def trace_has_events(trace_file: str) -> bool:
+    """
+    ETLファイルにプロバイダーのイベントが記録されているかを判定
+    
+    先頭のバッファはログファイルヘッダー専用のため、イベントが無くてもファイルは
+    数KBになる。バッファヘッダーだけを順に読み、ヘッダー用以外のバッファに
+    データが書かれていればイベントありとする（見つかった時点で打ち切る）。
+    """
+    header_size = ctypes.sizeof(WMI_BUFFER_HEADER)
+    try:
+        with open(trace_file, 'rb') as f:
+            while True:
+                data = f.read(header_size)
+                if len(data) < header_size:
+                    return False
+                header = WMI_BUFFER_HEADER.from_buffer_copy(data)
+                if header.BufferSize < header_size:
+                    return False
+                if header.BufferType != ETW_BUFFER_TYPE_HEADER and header.Offset > header_size:
+                    return True
+                f.seek(header.BufferSize - header_size, os.SEEK_CUR)
+    except OSError:
+        return False
+
+@dataclass(slots=True)
+class TraceFileInfo:
+    """トレースファイルの分析結果"""
+    path: str
+    size_bytes: int = 0
+    exists: bool = False
+    has_events: bool = False
+    
+    @property
+    def size_mb(self) -> float:
+        return self.size_bytes / (1024 * 1024)
 
 class IntelNPUETWMonitor:
     """Intel NPU ETW監視クラス"""
@@ -23,87 +273,113 @@ class IntelNPUETWMonitor:
         
         self.active_sessions = []
         self.trace_files = []
+        
+        # ETW APIが使えない環境ではlogmanにフォールバック
+        self._etw = ETWSessionController() if HAS_ETW_API else None
     
     def test_provider_availability(self) -> Dict[str, bool]:
         """NPUプロバイダーの利用可能性をテスト"""
         print("Testing Intel NPU ETW provider availability...")
         
-        results = {}
-        
+        # 登録の有無はTDHの一覧だけで判定し、未登録のプロバイダーはトレースを開始しない
+        registered = enumerate_registered_providers()
+        probes = {}
+        to_probe = {}
         for provider_name, provider_guid in self.npu_providers.items():
+            if registered is not None and provider_guid.strip('{}').upper() not in registered:
+                probes[provider_name] = (provider_name, False, ["  ✗ Provider is not registered on this system"])
+            else:
+                to_probe[provider_name] = provider_guid
+        
+        # 登録済みのものは実際にイベントが出るかを短時間のトレースで確認する
+        # セッションの開始・停止と2秒の待機はプロバイダー間で独立しているため並列に実行する
+        # （出力が混ざらないよう、各プロバイダーのログはまとめて順番に表示）
+        # テスト用のトレースは確認後に捨てるので、一時ディレクトリに書き出してまとめて削除する
+        if to_probe:
+            with tempfile.TemporaryDirectory(prefix="npu_etw_", ignore_cleanup_errors=True) as trace_dir, \
+                    ThreadPoolExecutor(max_workers=len(to_probe)) as executor:
+                for probe in executor.map(lambda item: self._probe_one_provider(*item, trace_dir),
+                                          to_probe.items()):
+                    probes[probe[0]] = probe
+        
+        results = {}
+        for provider_name in self.npu_providers:
+            _, available, log = probes[provider_name]
             print(f"\nTesting {provider_name}...")
+            for line in log:
+                print(line)
+            results[provider_name] = available
+        
+        return results
+    
+    def _probe_one_provider(self, provider_name: str, provider_guid: str,
+                            trace_dir: str = "") -> Tuple[str, bool, List[str]]:
+        """
+        単一プロバイダーで短時間のETWセッションを開始・停止して確認
+        
+        Args:
+            trace_dir: テスト用トレースファイルの出力先（省略時はカレントディレクトリ）
+            
+        Returns:
+            (provider_name, available, log): ログは表示用のメッセージ行
+        """
+        log = []
+        # 短時間のテストセッションを開始
+        session_name = f"NPU_Test_{provider_name.replace('-', '_')}"
+        trace_file = os.path.join(trace_dir, f"test_{provider_name.lower().replace('-', '_')}.etl")
+        
+        try:
+            # ETWセッション開始
+            started, error = self._start_session(session_name, trace_file)
+            if started:
+                started, error = self._enable_provider(session_name, provider_guid)
+            
+            if not started:
+                # 途中まで作成されたセッションが残らないよう停止しておく
+                self._stop_session(session_name)
+                log.append(f"  ✗ Failed to start session: {error}")
+                return (provider_name, False, log)
+            
+            log.append(f"  ✓ Successfully started ETW session")
+            
+            # 短時間待機
+            time.sleep(2)
+            
+            # セッション停止
+            stopped, error = self._stop_session(session_name)
             
+            if not stopped:
+                log.append(f"  ✗ Failed to stop session: {error}")
+                return (provider_name, False, log)
+            
+            log.append(f"  ✓ Successfully stopped ETW session")
+            
+            # ファイルサイズ確認
+            if not os.path.exists(trace_file):
+                log.append(f"  ⚠ No trace file generated")
+                return (provider_name, False, log)
+            
+            file_size = os.path.getsize(trace_file)
+            log.append(f"  ✓ Trace file created: {file_size} bytes")
+            
+            if trace_has_events(trace_file):
+                available = True
+                log.append(f"  🎯 Provider appears to be ACTIVE and generating events!")
+            else:
+                available = False
+                log.append(f"  ⚠ Provider available but no significant events generated")
+            
+            # テストファイルを削除
             try:
-                # 短時間のテストセッションを開始
-                session_name = f"NPU_Test_{provider_name.replace('-', '_')}"
-                trace_file = f"test_{provider_name.lower().replace('-', '_')}.etl"
-                
-                # ETWセッション開始
-                start_cmd = [
-                    "logman", "start", session_name,
-                    "-p", provider_guid,
-                    "-o", trace_file,
-                    "-ets"
-                ]
-                
-                result = subprocess.run(start_cmd, capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0:
-                    print(f"  ✓ Successfully started ETW session")
-                    
-                    # 短時間待機
-                    time.sleep(2)
-                    
-                    # セッション停止
-                    stop_cmd = ["logman", "stop", session_name, "-ets"]
-                    stop_result = subprocess.run(stop_cmd, capture_output=True, text=True, timeout=10)
-                    
-                    if stop_result.returncode == 0:
-                        print(f"  ✓ Successfully stopped ETW session")
-                        
-                        # ファイルサイズ確認
-                        if os.path.exists(trace_file):
-                            file_size = os.path.getsize(trace_file)
-                            print(f"  ✓ Trace file created: {file_size} bytes")
-                            
-                            if file_size > 1024:  # 1KB以上なら有効なデータがある可能性
-                                results[provider_name] = True
-                                print(f"  🎯 Provider appears to be ACTIVE and generating events!")
-                            else:
-                                results[provider_name] = False
-                                print(f"  ⚠ Provider available but no significant events generated")
-                            
-                            # テストファイルを削除
-                            try:
-                                os.remove(trace_file)
-                            except:
-                                pass
-                        else:
-                            results[provider_name] = False
-                            print(f"  ⚠ No trace file generated")
-                    else:
-                        results[provider_name] = False
-                        print(f"  ✗ Failed to stop session: {stop_result.stderr}")
-                else:
-                    results[provider_name] = False
-                    print(f"  ✗ Failed to start session: {result.stderr}")
-                    
-            except subprocess.TimeoutExpired:
-                results[provider_name] = False
-                print(f"  ✗ Timeout during ETW session test")
+                os.remove(trace_file)
+            except:
+                pass
+            return (provider_name, available, log)
                 
-                # クリーンアップ
-                try:
-                    subprocess.run(["logman", "stop", session_name, "-ets"], 
-                                 capture_output=True, timeout=5)
-                except:
-                    pass
-                    
-            except Exception as e:
-                results[provider_name] = False
-                print(f"  ✗ Error testing provider: {e}")
+        except Exception as e:
+            log.append(f"  ✗ Error testing provider: {e}")
         
-        return results
+        return (provider_name, False, log)
     
     def start_comprehensive_npu_monitoring(self, duration: int = 30) -> bool:
         """包括的NPU監視を開始"""
@@ -111,74 +387,123 @@ class IntelNPUETWMonitor:
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
+        # 全プロバイダーを1つのセッションにまとめる（バッファとトレースファイルも1つで済む）
+        session_name = f"NPU_All_{timestamp}"
+        trace_file = f"npu_all_{timestamp}.etl"
+        
+        created, error = self._start_session(session_name, trace_file, buffers=(128, 256))  # Buffer settings for better capture
+        if not created:
+            print(f"  ✗ Failed to create session {session_name}: {error}")
+            return False
+        
+        self.active_sessions.append(session_name)
+        self.trace_files.append(trace_file)
+        
         active_providers = []
         
-        # 各プロバイダーで個別セッションを開始
+        # 各プロバイダーを同じセッションに追加
         for provider_name, provider_guid in self.npu_providers.items():
-            session_name = f"NPU_{provider_name.replace('-', '_')}_{timestamp}"
-            trace_file = f"npu_{provider_name.lower().replace('-', '_')}_{timestamp}.etl"
-            
-            try:
-                start_cmd = [
-                    "logman", "start", session_name,
-                    "-p", provider_guid,
-                    "-o", trace_file,
-                    "-ets",
-                    "-nb", "128", "256"  # Buffer settings for better capture
-                ]
-                
-                result = subprocess.run(start_cmd, capture_output=True, text=True)
-                
-                if result.returncode == 0:
-                    print(f"  ✓ Started monitoring {provider_name}")
-                    active_providers.append({
-                        'name': provider_name,
-                        'session': session_name,
-                        'file': trace_file,
-                        'guid': provider_guid
-                    })
-                    self.active_sessions.append(session_name)
-                    self.trace_files.append(trace_file)
-                else:
-                    print(f"  ✗ Failed to start {provider_name}: {result.stderr}")
-                    
-            except Exception as e:
-                print(f"  ✗ Error starting {provider_name}: {e}")
+            enabled, error = self._enable_provider(session_name, provider_guid)
+            if enabled:
+                print(f"  ✓ Started monitoring {provider_name}")
+                active_providers.append(provider_name)
+            else:
+                print(f"  ✗ Failed to start {provider_name}: {error}")
         
         if not active_providers:
             print("❌ No NPU providers could be started")
+            self._stop_session(session_name)
             return False
         
         print(f"\n🚀 Monitoring {len(active_providers)} NPU providers...")
         print("💡 Now would be a good time to run AI applications to generate NPU events!")
         print("   Try running: AI inference, image processing, or machine learning tasks")
         
-        # 指定時間待機
-        for i in range(duration):
-            remaining = duration - i
-            print(f"\r⏱ Monitoring... {remaining:02d}s remaining", end='', flush=True)
-            time.sleep(1)
+        # 指定時間待機（カウントダウン表示は別スレッド、待機自体は1回のsleep）
+        stop_countdown = threading.Event()
+        countdown = threading.Thread(
+            target=self._show_countdown,
+            args=(time.monotonic() + duration, stop_countdown),
+            daemon=True
+        )
+        countdown.start()
+        try:
+            time.sleep(duration)
+        finally:
+            stop_countdown.set()
+            countdown.join()
         
         print(f"\n⏹ Stopping NPU monitoring...")
         
-        # すべてのセッションを停止
-        stopped_successfully = 0
-        for provider in active_providers:
-            try:
-                stop_cmd = ["logman", "stop", provider['session'], "-ets"]
-                result = subprocess.run(stop_cmd, capture_output=True, text=True)
-                
-                if result.returncode == 0:
-                    print(f"  ✓ Stopped {provider['name']}")
-                    stopped_successfully += 1
-                else:
-                    print(f"  ✗ Error stopping {provider['name']}: {result.stderr}")
-                    
-            except Exception as e:
-                print(f"  ✗ Exception stopping {provider['name']}: {e}")
-        
-        print(f"\n✅ Monitoring completed! Stopped {stopped_successfully}/{len(active_providers)} sessions")
-        return stopped_successfully > 0
+        stopped, error = self._stop_session(session_name)
+        if stopped:
+            print(f"  ✓ Stopped {session_name} ({len(active_providers)} providers)")
+        else:
+            print(f"  ✗ Error stopping {session_name}: {error}")
+        
+        if stopped:
+            print(f"\n✅ Monitoring completed!")
+        else:
+            print(f"\n⚠ Monitoring completed, but the session could not be stopped")
+        return stopped
+    
+    def _show_countdown(self, deadline: float, stop_event: threading.Event):
+        """残り秒数を表示（開始時とCOUNTDOWN_STEP秒の区切りでのみ書き込む）"""
+        write = sys.stdout.write
+        flush = sys.stdout.flush
+        last_remaining = None
+        while True:
+            remaining = max(0, math.ceil(deadline - time.monotonic()))
+            if remaining != last_remaining and (last_remaining is None or remaining % COUNTDOWN_STEP == 0):
+                write(_COUNTDOWN_FMT % remaining)
+                flush()
+                last_remaining = remaining
+            if stop_event.wait(0.25):
+                return
+    
+    def _start_session(self, session_name: str, trace_file: str,
+                       buffers: Optional[Tuple[int, int]] = None) -> Tuple[bool, str]:
+        """
+        ファイル出力のETWセッションを作成（プロバイダーは_enable_providerで追加）
+        
+        Args:
+            buffers: (最小バッファ数, 最大バッファ数)。Noneの場合は既定値
+            
+        Returns:
+            (成功したか, エラーメッセージ)
+        """
+        if self._etw is not None:
+            return self._etw.start(session_name, trace_file, *(buffers or (0, 0)))
+        
+        cmd = ["logman", "create", "trace", session_name, "-o", trace_file, "-ets"]
+        if buffers:
+            cmd += ["-nb", str(buffers[0]), str(buffers[1])]
+        return self._run_logman(cmd)
+    
+    def _enable_provider(self, session_name: str, provider_guid: str) -> Tuple[bool, str]:
+        """プロバイダーをセッションに追加し、(成功したか, エラーメッセージ) を返す"""
+        if self._etw is not None:
+            return self._etw.enable_provider(session_name, provider_guid)
+        return self._run_logman(["logman", "update", "trace", session_name, "-p", provider_guid, "-ets"])
+    
+    def _stop_session(self, session_name: str) -> Tuple[bool, str]:
+        """ETWセッションを停止し、(成功したか, エラーメッセージ) を返す"""
+        if self._etw is not None:
+            return self._etw.stop(session_name)
+        return self._run_logman(["logman", "stop", session_name, "-ets"])
+    
+    def _run_logman(self, cmd: List[str], timeout: int = 10) -> Tuple[bool, str]:
+        """logmanを実行し、(成功したか, エラーメッセージ) を返す"""
+        try:
+            # 標準出力は使わないので捨て、標準エラーは失敗時だけデコードする
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+            if result.returncode == 0:
+                return (True, "")
+            return (False, result.stderr.decode(locale.getpreferredencoding(False), errors='replace'))
+        except subprocess.TimeoutExpired:
+            return (False, "Timeout")
+        except Exception as e:
+            return (False, f"Exception: {e}")
     
     def analyze_collected_traces(self) -> Dict[str, any]:
         """収集されたトレースファイルを分析"""
@@ -191,36 +516,28 @@ class IntelNPUETWMonitor:
             'recommendations': []
         }
         
-        total_size = 0
-        active_files = 0
+        file_analysis: List[TraceFileInfo] = analysis_results['file_analysis']
         
         for trace_file in self.trace_files:
-            file_info = {
-                'file': trace_file,
-                'exists': False,
-                'size_bytes': 0,
-                'size_mb': 0.0,
-                'has_events': False
-            }
+            info = TraceFileInfo(trace_file)
+            file_analysis.append(info)
             
-            if os.path.exists(trace_file):
-                file_info['exists'] = True
-                file_size = os.path.getsize(trace_file)
-                file_info['size_bytes'] = file_size
-                file_info['size_mb'] = file_size / (1024 * 1024)
-                total_size += file_size
-                
-                # 有意なイベントがあるかチェック（1KB以上）
-                if file_size > 1024:
-                    file_info['has_events'] = True
-                    active_files += 1
-                    print(f"  📄 {trace_file}: {file_info['size_mb']:.2f} MB ✅ Has events")
-                else:
-                    print(f"  📄 {trace_file}: {file_info['size_mb']:.2f} MB ⚠ Minimal data")
-            else:
+            # 存在確認とサイズ取得を1回のstatで行う
+            try:
+                info.size_bytes = os.stat(trace_file).st_size
+            except FileNotFoundError:
                 print(f"  📄 {trace_file}: ❌ File not found")
+                continue
+            info.exists = True
+            info.has_events = trace_has_events(trace_file)
             
-            analysis_results['file_analysis'].append(file_info)
+            if info.has_events:
+                print(f"  📄 {trace_file}: {info.size_mb:.2f} MB ✅ Has events")
+            else:
+                print(f"  📄 {trace_file}: {info.size_mb:.2f} MB ⚠ Minimal data")
+        
+        total_size = sum(info.size_bytes for info in file_analysis)
+        active_files = sum(1 for info in file_analysis if info.has_events)
         
         # サマリー作成
         analysis_results['summary'] = {
@@ -263,11 +580,7 @@ class IntelNPUETWMonitor:
         
         # アクティブセッションを強制停止
         for session in self.active_sessions:
-            try:
-                subprocess.run(["logman", "stop", session, "-ets"], 
-                             capture_output=True, timeout=5)
-            except:
-                pass
+            self._stop_session(session)
         
         print("✅ Cleanup completed")
     
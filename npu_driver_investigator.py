@@ -4,12 +4,288 @@ NPU ドライバー・サービス状態調査スクリプト
 Intel NPUの詳細な状態とドライバー情報を調査
 """
 
+import ctypes
+import functools
 import subprocess
 import sys
 import os
-from typing import Dict, List, Optional
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import json
 
+try:
+    import winreg
+except ImportError:
+    winreg = None  # Windows以外
+
+# wmi（pywin32）の読み込みは重いため、実際に使う時点まで遅延させる
+wmi = None
+
+@functools.lru_cache(maxsize=1)
+def _load_wmi() -> bool:
+    """wmiを遅延インポートし、利用可能かどうかを返す"""
+    global wmi
+    try:
+        import wmi as module
+    except ImportError:
+        return False
+    wmi = module
+    return True
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads  # orjsonが無ければ標準ライブラリで解析
+
+# PowerShellコマンド1回あたりの既定タイムアウト（秒）
+POWERSHELL_TIMEOUT_SEC = 30
+# CIM問い合わせの1回目のタイムアウト（秒）。超えた場合はPOWERSHELL_TIMEOUT_SECで再試行する
+INVENTORY_FAST_TIMEOUT_SEC = 5
+# コマンド出力の終端とエラーを示すマーカー
+_PS_END_MARKER = "<<<END>>>"
+_PS_ERROR_MARKER = "<<<ERROR>>>"
+
+# ドライバーファイル検索結果のキャッシュ（ディレクトリが変わっていなければ再走査しない）
+DRIVER_FILE_CACHE_PATH = os.path.join(
+    os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "npu_investigator", "driverfiles.json"
+)
+
+# ドライバーファイル名のキーワード（小文字化したファイル名に対して照合）
+_DRIVER_NAME_RE = re.compile(r'npu|neural|ai|boost')
+_DRIVER_FILE_EXTENSIONS = ('.sys', '.dll', '.inf')
+# 直下のサブディレクトリがこの数以上あれば、複数プロセスに分けて走査する（DriverStore向け）
+DRIVER_SCAN_PARALLEL_MIN_DIRS = 64
+# 包括調査のワーカースレッド数（1段あたり最大2フェーズ + 管理者権限の確認）
+INVESTIGATION_MAX_WORKERS = 3
+
+# NPU関連サービスとみなす名前のキーワード
+NPU_SERVICE_KEYWORDS = ('npu', 'neural', 'ai', 'intel', 'boost', 'accelerator')
+# サービス名・表示名のキーワード照合はWMI側で行う（WQLのLIKEは大文字小文字を区別しない）
+_SERVICE_FILTER = " OR ".join(
+    f"Name LIKE '%{keyword}%' OR DisplayName LIKE '%{keyword}%'" for keyword in NPU_SERVICE_KEYWORDS
+)
+
+_PNP_FILTER = "Name LIKE '%NPU%' OR Name LIKE '%Neural%' OR Name LIKE '%AI Boost%'"
+_VIDEO_FILTER = "Name LIKE '%Intel%'"
+
+# インベントリの各項目で取得する列
+_SERVICE_FIELDS = ("Name", "DisplayName", "State", "StartMode")
+_PNP_FIELDS = ("Name", "DeviceID", "Status", "ConfigManagerErrorCode", "Manufacturer", "Service")
+_VIDEO_FIELDS = ("Name", "DriverVersion", "Status", "DriverDate")
+
+# サービス・NPUデバイス・Intel GPUを1回のCIM問い合わせでまとめて取得するコマンド
+# （wmiパッケージが無い場合に使用。必要な列だけに絞り、@()で0件/1件でも配列としてJSON化する）
+_INVENTORY_COMMAND = (
+    f"$s = @(Get-CimInstance Win32_Service -Filter \"{_SERVICE_FILTER}\" "
+    "| Select-Object Name,DisplayName,State,StartMode); "
+    "$p = @(Get-CimInstance -ClassName Win32_PnPEntity "
+    f"-Filter \"{_PNP_FILTER}\" "
+    "| Select-Object Name,DeviceID,Status,ConfigManagerErrorCode,Manufacturer,Service); "
+    f"$v = @(Get-CimInstance Win32_VideoController -Filter \"{_VIDEO_FILTER}\" "
+    "| Select-Object Name,DriverVersion,Status,"
+    "@{n='DriverDate';e={if ($_.DriverDate) { $_.DriverDate.ToString('yyyy-MM-dd') }}}); "
+    "@{services=$s; pnp=$p; video=$v} | ConvertTo-Json -Depth 4 -Compress"
+)
+
+class PowerShellSession:
+    """
+    powershell.exeを1つ起動したままにし、標準入力からコマンドを順に実行する
+    
+    コマンドごとにpowershell.exeを起動すると毎回数百msの初期化がかかるため、
+    プロセスを使い回して2回目以降の起動コストを無くす。
+    """
+    
+    def __init__(self):
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+    
+    def _start(self):
+        self._proc = subprocess.Popen(
+            ["powershell", "-NoProfile", "-NoLogo", "-ExecutionPolicy", "Bypass", "-Command", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="replace"
+        )
+        # タイムアウトを扱えるよう、標準出力は別スレッドで読み続けてキューに渡す
+        self._lines = queue.Queue()
+        threading.Thread(target=self._drain, args=(self._proc.stdout, self._lines), daemon=True).start()
+        # 出力をBOMなしUTF-8に揃え、コマンドレットのエラーはcatchで拾えるようにする
+        self._proc.stdin.write("[Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false; "
+                               "$ErrorActionPreference = 'Stop'\n")
+    
+    @staticmethod
+    def _drain(stream, lines: "queue.Queue[Optional[str]]"):
+        for line in stream:
+            lines.put(line.rstrip("\r\n"))
+        lines.put(None)  # EOF
+    
+    def run(self, command: str, timeout: float = POWERSHELL_TIMEOUT_SEC) -> Tuple[bool, str]:
+        """
+        コマンドを実行して出力を取得
+        
+        Args:
+            command: 1行のPowerShellコマンド
+            timeout: 出力を待つ最大秒数（超過した場合はプロセスを終了し、次回起動し直す）
+            
+        Returns:
+            (成功したか, 標準出力またはエラーメッセージ)
+            
+        Raises:
+            subprocess.TimeoutExpired: timeout以内に出力が終わらなかった場合
+        """
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            
+            try:
+                self._proc.stdin.write(
+                    f"try {{ {command} }} catch {{ Write-Output ('{_PS_ERROR_MARKER} ' + $_) }}; "
+                    f"Write-Output '{_PS_END_MARKER}'\n"
+                )
+                self._proc.stdin.flush()
+            except OSError as e:
+                self._kill()
+                return (False, str(e))
+            
+            deadline = time.monotonic() + timeout
+            output = []
+            error = None
+            while True:
+                try:
+                    line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self._kill()
+                    raise subprocess.TimeoutExpired(command, timeout)
+                if line is None:
+                    self._kill()
+                    return (False, "PowerShell exited unexpectedly")
+                if line == _PS_END_MARKER:
+                    break
+                if line.startswith(_PS_ERROR_MARKER):
+                    error = line[len(_PS_ERROR_MARKER):].strip()
+                else:
+                    output.append(line)
+            
+            if error is not None:
+                return (False, error)
+            return (True, "\n".join(output))
+    
+    def _kill(self):
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+            except OSError:
+                pass
+            self._proc = None
+    
+    def close(self):
+        """PowerShellを終了"""
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.write("exit\n")
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=5)
+                self._proc = None
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def _match_driver_files(root: str, names: List[str]) -> List[str]:
+    """root直下のファイル名からNPU関連のドライバーファイルを選ぶ"""
+    npu_in_root = 'npu' in root.lower()
+    found_files = []
+    for name in names:
+        name_lower = name.lower()
+        if not name_lower.endswith(_DRIVER_FILE_EXTENSIONS):
+            continue
+        if not _DRIVER_NAME_RE.search(name_lower):
+            continue
+        if npu_in_root or 'npu' in name_lower:
+            found_files.append(os.path.join(root, name))
+    return found_files
+
+def _scan_driver_dir(path: str) -> List[str]:
+    """
+    ディレクトリ配下を再帰的に走査してNPU関連のドライバーファイルを探す
+    （ProcessPoolExecutorのワーカーから呼ぶため、モジュールレベルの関数にしている）
+    """
+    found_files = []
+    # 各ディレクトリを1回だけ走査し、全キーワードをまとめて照合する
+    for root, _, files in os.walk(path):
+        found_files.extend(_match_driver_files(root, files))
+    return found_files
+
+# NPU有効化手順の提案（表示用に1つの文字列へまとめておく）
+NPU_ACTIVATION_STEPS = "\n".join((
+    "🔧 NPU Activation Troubleshooting Steps:",
+    "",
+    "1. **Update Intel Graphics Driver**:",
+    "   - Download latest driver from Intel website",
+    "   - Ensure driver supports Intel AI Boost NPU",
+    "   - Reboot after installation",
+    "",
+    "2. **Enable NPU in BIOS/UEFI**:",
+    "   - Enter BIOS/UEFI settings during boot",
+    "   - Look for 'Intel AI Boost', 'NPU', or 'Neural Processing' options",
+    "   - Enable if found and save settings",
+    "",
+    "3. **Windows Settings**:",
+    "   - Check Device Manager for NPU device status",
+    "   - Update device drivers if showing warnings",
+    "   - Restart Windows Update service",
+    "",
+    "4. **Intel Software**:",
+    "   - Install Intel Arc & Iris Xe Graphics software",
+    "   - Check for Intel AI acceleration settings",
+    "   - Verify OpenVINO or Intel Distribution for Python support",
+    "",
+    "5. **Test NPU Access**:",
+    "   - Run AI applications that support NPU acceleration",
+    "   - Check DirectML device enumeration",
+    "   - Test with Intel OpenVINO samples",
+    "",
+    "6. **Administrative Access**:",
+    "   - Run ETW monitoring as Administrator",
+    "   - Ensure proper permissions for hardware access",
+    "   - Check Windows Security policies"
+))
+
+@dataclass(slots=True, frozen=True)
+class NpuService:
+    """NPU関連のWindowsサービス"""
+    name: str
+    display_name: str
+    status: str
+    start_type: str
+
+@dataclass(slots=True, frozen=True)
+class NpuDevice:
+    """NPUデバイス（Win32_PnPEntity）"""
+    name: str
+    device_id: str
+    status: str
+    state: Optional[int]  # ConfigManagerErrorCode（0 = 正常）
+    manufacturer: str
+    driver: str
+
 class NPUDriverInvestigator:
     """NPU ドライバー・サービス調査クラス"""
     
@@ -17,135 +293,207 @@ class NPUDriverInvestigator:
         self.npu_related_services = []
         self.npu_devices = []
         self.driver_info = {}
+        # PowerShellを使う調査はすべてこのセッションで実行する（起動は初回のみ）
+        self._ps = PowerShellSession()
+        # CIM問い合わせ結果（各フェーズで共有するため最初の1回だけ実行）
+        self._inventory: Optional[Tuple[bool, Any]] = None
+        self._inventory_lock = threading.Lock()
+        # CIM問い合わせが1回目のタイムアウトを超えた（WMIプロバイダーが遅い・壊れている）
+        self.inventory_degraded = False
+    
+    def close(self):
+        """PowerShellセッションを終了"""
+        self._ps.close()
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def _get_inventory(self) -> Tuple[bool, Any]:
+        """
+        サービス・NPUデバイス・Intel GPUの情報を取得（結果はキャッシュ）
+        
+        Returns:
+            (成功したか, {'services', 'pnp', 'video'}の辞書またはエラーメッセージ)
+        """
+        with self._inventory_lock:
+            if self._inventory is None:
+                self._inventory = self._query_inventory_wmi() or self._query_inventory_powershell()
+            return self._inventory
+    
+    @staticmethod
+    def _query_inventory_wmi() -> Optional[Tuple[bool, Any]]:
+        """
+        wmiパッケージでインベントリをプロセス内から取得
+        
+        Returns:
+            _get_inventory と同じ形式の結果（wmiが使えない・失敗した場合はNone）
+        """
+        if not _load_wmi():
+            return None
+        
+        import pythoncom  # pywin32（wmiの依存）に含まれる
+        
+        def rows(c, wql: str, fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+            # COMオブジェクトはCoUninitialize後に使えないため、ここで辞書に写す
+            return [{field: getattr(item, field, None) for field in fields} for item in c.query(wql)]
+        
+        # 調査フェーズはワーカースレッドで動くため、スレッドごとにCOMを初期化する
+        pythoncom.CoInitialize()
+        try:
+            c = wmi.WMI()
+            inventory = {
+                'services': rows(c, f"SELECT {','.join(_SERVICE_FIELDS)} FROM Win32_Service WHERE {_SERVICE_FILTER}",
+                                 _SERVICE_FIELDS),
+                'pnp': rows(c, f"SELECT {','.join(_PNP_FIELDS)} FROM Win32_PnPEntity WHERE {_PNP_FILTER}",
+                            _PNP_FIELDS),
+                'video': rows(c, f"SELECT {','.join(_VIDEO_FIELDS)} FROM Win32_VideoController WHERE {_VIDEO_FILTER}",
+                              _VIDEO_FIELDS),
+            }
+        except Exception:
+            return None
+        finally:
+            pythoncom.CoUninitialize()
+        
+        # DriverDateはCIM日時文字列（yyyymmddHHMMSS.ffffff+zzz）なのでPowerShell版と同じ表記に揃える
+        for controller in inventory['video']:
+            driver_date = controller.get('DriverDate')
+            if driver_date and len(driver_date) >= 8:
+                controller['DriverDate'] = f"{driver_date[:4]}-{driver_date[4:6]}-{driver_date[6:8]}"
+        
+        return (True, inventory)
+    
+    def _query_inventory_powershell(self) -> Tuple[bool, Any]:
+        """PowerShell（Get-CimInstance）でインベントリを取得"""
+        try:
+            try:
+                ok, output = self._ps.run(_INVENTORY_COMMAND, timeout=INVENTORY_FAST_TIMEOUT_SEC)
+            except subprocess.TimeoutExpired:
+                # 通常は数秒で終わるため、超えた場合は長いタイムアウトで1回だけやり直す
+                self.inventory_degraded = True
+                ok, output = self._ps.run(_INVENTORY_COMMAND, timeout=POWERSHELL_TIMEOUT_SEC)
+        except subprocess.TimeoutExpired as e:
+            return (False, str(e))
+        
+        if not ok:
+            return (False, output)
+        try:
+            return (True, _json_loads(output))
+        except ValueError as e:
+            return (False, f"Invalid JSON from PowerShell: {e}")
     
-    def check_administrator_privileges(self) -> bool:
-        """管理者権限の確認"""
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def check_administrator_privileges() -> bool:
+        """管理者権限の確認（プロセス中は変わらないため結果をキャッシュ）"""
         try:
-            # 管理者権限でのみアクセス可能なレジストリキーにアクセス試行
-            result = subprocess.run(
-                ["reg", "query", "HKLM\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Policies\\System", "/v", "EnableLUA"],
-                capture_output=True,
-                text=True
-            )
-            return result.returncode == 0
-        except:
+            return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        except (AttributeError, OSError):
+            # Windows以外、またはshell32が使えない環境
             return False
     
-    def discover_npu_services(self) -> List[Dict[str, str]]:
+    def discover_npu_services(self, out: Callable[[str], None] = print) -> List[NpuService]:
         """NPU関連サービスの発見"""
-        print("Discovering NPU-related Windows services...")
+        out("Discovering NPU-related Windows services...")
         
         try:
-            # Get-Service でサービス一覧を取得
-            result = subprocess.run(
-                ["powershell", "-Command", "Get-Service | ConvertTo-Json"],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            # Win32_Service でサービス一覧を取得
+            ok, inventory = self._get_inventory()
             
-            if result.returncode != 0:
-                print(f"Error getting services: {result.stderr}")
+            if not ok:
+                out(f"Error getting services: {inventory}")
                 return []
             
-            services = json.loads(result.stdout)
+            # キーワードによる絞り込みはWMI側で済んでいる
+            services = inventory.get('services') or []
             npu_services = []
             
-            npu_keywords = ['npu', 'neural', 'ai', 'intel', 'boost', 'accelerator']
-            
             for service in services:
-                service_name = service.get('Name', '').lower()
-                display_name = service.get('DisplayName', '').lower()
-                
-                if any(keyword in service_name or keyword in display_name for keyword in npu_keywords):
-                    npu_services.append({
-                        'Name': service.get('Name', ''),
-                        'DisplayName': service.get('DisplayName', ''),
-                        'Status': service.get('Status', ''),
-                        'StartType': service.get('StartType', '')
-                    })
-                    print(f"  Found: {service.get('DisplayName', service.get('Name', 'Unknown'))}")
-                    print(f"    Status: {service.get('Status', 'Unknown')}")
+                npu_service = NpuService(
+                    name=service.get('Name', ''),
+                    display_name=service.get('DisplayName', ''),
+                    status=service.get('State', ''),
+                    start_type=service.get('StartMode', '')
+                )
+                npu_services.append(npu_service)
+                out(f"  Found: {npu_service.display_name or npu_service.name or 'Unknown'}")
+                out(f"    Status: {npu_service.status or 'Unknown'}")
             
             return npu_services
             
         except Exception as e:
-            print(f"Error discovering NPU services: {e}")
+            out(f"Error discovering NPU services: {e}")
             return []
     
-    def check_npu_device_status(self) -> List[Dict[str, str]]:
+    def check_npu_device_status(self, out: Callable[[str], None] = print) -> List[NpuDevice]:
         """NPUデバイス状態の確認"""
-        print("\\nChecking NPU device status via Device Manager...")
+        out("\nChecking NPU device status via Device Manager...")
         
         try:
             # デバイスマネージャー情報を取得
-            result = subprocess.run([
-                "powershell", "-Command",
-                "Get-WmiObject -Class Win32_PnPEntity | Where-Object {$_.Name -like '*NPU*' -or $_.Name -like '*Neural*' -or $_.Name -like '*AI Boost*'} | ConvertTo-Json"
-            ], capture_output=True, text=True, timeout=30)
+            ok, inventory = self._get_inventory()
             
-            if result.returncode != 0:
-                print(f"Error getting device info: {result.stderr}")
+            if not ok:
+                out(f"Error getting device info: {inventory}")
                 return []
             
-            if not result.stdout.strip():
-                print("  No NPU devices found via WMI")
+            devices = inventory.get('pnp') or []
+            if not devices:
+                out("  No NPU devices found via WMI")
                 return []
             
-            devices = json.loads(result.stdout)
-            if not isinstance(devices, list):
-                devices = [devices]
-            
             npu_devices = []
             for device in devices:
-                device_info = {
-                    'Name': device.get('Name', 'Unknown'),
-                    'DeviceID': device.get('DeviceID', ''),
-                    'Status': device.get('Status', ''),
-                    'State': device.get('ConfigManagerErrorCode', ''),
-                    'Manufacturer': device.get('Manufacturer', ''),
-                    'Driver': device.get('Service', '')
-                }
-                npu_devices.append(device_info)
+                npu_device = NpuDevice(
+                    name=device.get('Name', 'Unknown'),
+                    device_id=device.get('DeviceID', ''),
+                    status=device.get('Status', ''),
+                    state=device.get('ConfigManagerErrorCode'),
+                    manufacturer=device.get('Manufacturer', ''),
+                    driver=device.get('Service', '')
+                )
+                npu_devices.append(npu_device)
                 
-                print(f"  Device: {device_info['Name']}")
-                print(f"    Status: {device_info['Status']}")
-                print(f"    Driver: {device_info['Driver']}")
-                print(f"    Manufacturer: {device_info['Manufacturer']}")
+                out(f"  Device: {npu_device.name}")
+                out(f"    Status: {npu_device.status}")
+                out(f"    Driver: {npu_device.driver}")
+                out(f"    Manufacturer: {npu_device.manufacturer}")
             
             return npu_devices
             
         except Exception as e:
-            print(f"Error checking NPU device status: {e}")
+            out(f"Error checking NPU device status: {e}")
             return []
     
-    def check_intel_graphics_driver(self) -> Dict[str, str]:
-        """Intel グラフィックスドライバー情報確認"""
-        print("\\nChecking Intel Graphics driver information...")
+    def check_intel_graphics_driver(self, out: Callable[[str], None] = print) -> Optional[Dict[str, str]]:
+        """
+        Intel グラフィックスドライバー情報確認
+        
+        Returns:
+            最初のIntel GPUの情報（見つからなければ空の辞書、問い合わせ自体が失敗した場合はNone）
+        """
+        out("\nChecking Intel Graphics driver information...")
         
         try:
             # Intel グラフィックス情報を取得
-            result = subprocess.run([
-                "powershell", "-Command",
-                "Get-WmiObject -Class Win32_VideoController | Where-Object {$_.Name -like '*Intel*'} | ConvertTo-Json"
-            ], capture_output=True, text=True, timeout=30)
+            ok, inventory = self._get_inventory()
             
-            if result.returncode != 0:
-                return {}
+            if not ok:
+                out(f"Error getting graphics info: {inventory}")
+                return None
             
-            if not result.stdout.strip():
-                print("  No Intel graphics controllers found")
+            controllers = inventory.get('video') or []
+            if not controllers:
+                out("  No Intel graphics controllers found")
                 return {}
             
-            controllers = json.loads(result.stdout)
-            if not isinstance(controllers, list):
-                controllers = [controllers]
-            
             for controller in controllers:
-                print(f"  Graphics Controller: {controller.get('Name', 'Unknown')}")
-                print(f"    Driver Version: {controller.get('DriverVersion', 'Unknown')}")
-                print(f"    Driver Date: {controller.get('DriverDate', 'Unknown')}")
-                print(f"    Status: {controller.get('Status', 'Unknown')}")
+                out(f"  Graphics Controller: {controller.get('Name', 'Unknown')}")
+                out(f"    Driver Version: {controller.get('DriverVersion', 'Unknown')}")
+                out(f"    Driver Date: {controller.get('DriverDate', 'Unknown')}")
+                out(f"    Status: {controller.get('Status', 'Unknown')}")
                 
                 return {
                     'Name': controller.get('Name', ''),
@@ -155,136 +503,196 @@ class NPUDriverInvestigator:
                 }
             
         except Exception as e:
-            print(f"Error checking Intel graphics driver: {e}")
+            out(f"Error checking Intel graphics driver: {e}")
+            return None
         
         return {}
     
-    def check_npu_driver_files(self) -> List[str]:
+    def check_npu_driver_files(self, out: Callable[[str], None] = print) -> List[str]:
         """NPU関連ドライバーファイルの確認"""
-        print("\\nChecking for NPU driver files...")
+        out("\nChecking for NPU driver files...")
         
         driver_locations = [
-            r"C:\\Windows\\System32\\drivers",
-            r"C:\\Windows\\System32\\DriverStore\\FileRepository"
+            r"C:\Windows\System32\drivers",
+            r"C:\Windows\System32\DriverStore\FileRepository"
         ]
         
-        npu_patterns = ['*npu*', '*neural*', '*ai*', '*boost*']
         found_files = []
+        cache = self._load_driver_file_cache()
+        cache_updated = False
         
         for location in driver_locations:
-            print(f"  Scanning {location}...")
+            out(f"  Scanning {location}...")
             
-            for pattern in npu_patterns:
-                try:
-                    result = subprocess.run([
-                        "powershell", "-Command",
-                        f"Get-ChildItem -Path '{location}' -Recurse -Include '{pattern}.sys', '{pattern}.dll', '{pattern}.inf' -ErrorAction SilentlyContinue | Select-Object FullName, Length, LastWriteTime | ConvertTo-Json"
-                    ], capture_output=True, text=True, timeout=15)
-                    
-                    if result.returncode == 0 and result.stdout.strip():
-                        try:
-                            files = json.loads(result.stdout)
-                            if not isinstance(files, list):
-                                files = [files]
-                            
-                            for file_info in files:
-                                file_path = file_info.get('FullName', '')
-                                if file_path and 'npu' in file_path.lower():
-                                    found_files.append(file_path)
-                                    print(f"    Found: {file_path}")
-                        except json.JSONDecodeError:
-                            pass
-                            
-                except Exception:
-                    continue
+            # ディレクトリのタイムスタンプが前回と同じなら前回の結果を使う
+            try:
+                stat = os.stat(location)
+                key = [stat.st_mtime_ns, stat.st_ctime_ns]
+            except OSError:
+                key = None
+            
+            cached = cache.get(location)
+            if key is not None and isinstance(cached, dict) and cached.get('key') == key:
+                out("    (unchanged since last scan, using cached results)")
+                location_files = cached.get('files', [])
+            else:
+                location_files = self._scan_driver_location(location)
+                if key is not None:
+                    cache[location] = {'key': key, 'files': location_files}
+                    cache_updated = True
+            
+            for file_path in location_files:
+                found_files.append(file_path)
+                out(f"    Found: {file_path}")
+        
+        if cache_updated:
+            self._save_driver_file_cache(cache)
         
         if not found_files:
-            print("  No NPU-specific driver files found")
+            out("  No NPU-specific driver files found")
         
         return found_files
     
-    def check_registry_npu_entries(self) -> Dict[str, any]:
+    @staticmethod
+    def _scan_driver_location(location: str) -> List[str]:
+        """
+        ディレクトリ配下からNPU関連のドライバーファイルを探す
+        
+        Args:
+            location: 走査するディレクトリ
+            
+        Returns:
+            見つかったファイルのパス一覧
+        """
+        try:
+            with os.scandir(location) as it:
+                entries = list(it)
+        except OSError:
+            return []
+        
+        subdirs = [entry.path for entry in entries if entry.is_dir()]
+        found_files = _match_driver_files(location, [entry.name for entry in entries if not entry.is_dir()])
+        
+        if len(subdirs) < DRIVER_SCAN_PARALLEL_MIN_DIRS:
+            for subdir in subdirs:
+                found_files.extend(_scan_driver_dir(subdir))
+            return found_files
+        
+        # DriverStoreのようにパッケージごとのサブディレクトリが大量にある場合は、
+        # サブディレクトリ単位で複数プロセスに分けて走査する
+        workers = max(1, min(4, (os.cpu_count() or 2) // 2))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                subdir_results = list(executor.map(_scan_driver_dir, subdirs, chunksize=16))
+        except (OSError, BrokenProcessPool):
+            subdir_results = [_scan_driver_dir(subdir) for subdir in subdirs]
+        
+        for files in subdir_results:
+            found_files.extend(files)
+        return found_files
+    
+    @staticmethod
+    def _load_driver_file_cache() -> Dict[str, Any]:
+        """ドライバーファイル検索結果のキャッシュを読み込み（無い・壊れている場合は空）"""
+        try:
+            with open(DRIVER_FILE_CACHE_PATH, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    @staticmethod
+    def _save_driver_file_cache(cache: Dict[str, Any]):
+        """ドライバーファイル検索結果のキャッシュを保存（失敗しても調査は続ける）"""
+        try:
+            os.makedirs(os.path.dirname(DRIVER_FILE_CACHE_PATH), exist_ok=True)
+            temp_path = DRIVER_FILE_CACHE_PATH + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(temp_path, DRIVER_FILE_CACHE_PATH)
+        except OSError:
+            pass
+    
+    def check_registry_npu_entries(self, out: Callable[[str], None] = print) -> Dict[str, any]:
         """レジストリのNPU関連エントリ確認"""
-        print("\\nChecking registry for NPU entries...")
+        out("\nChecking registry for NPU entries...")
         
+        # (表示名, HKLM配下のキー, 調べる深さ)
+        # Servicesはサービスごとのキー直下、Classはデバイスインスタンス配下までで十分
         registry_paths = [
-            r"HKLM\\SYSTEM\\CurrentControlSet\\Services",
-            r"HKLM\\SYSTEM\\CurrentControlSet\\Control\\Class\\{4d36e968-e325-11ce-bfc1-08002be10318}",  # Display adapters
-            r"HKLM\\SOFTWARE\\Intel"
+            (r"HKLM\SYSTEM\CurrentControlSet\Services",
+             r"SYSTEM\CurrentControlSet\Services", 1),
+            (r"HKLM\SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}",  # Display adapters
+             r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}", 2),
+            (r"HKLM\SOFTWARE\Intel", r"SOFTWARE\Intel", 4)
         ]
         
         npu_entries = {}
         
-        for reg_path in registry_paths:
-            print(f"  Checking {reg_path}...")
+        for reg_path, subkey, max_depth in registry_paths:
+            out(f"  Checking {reg_path}...")
             
             try:
-                result = subprocess.run([
-                    "reg", "query", reg_path, "/s", "/f", "NPU", "/t", "REG_SZ"
-                ], capture_output=True, text=True, timeout=10)
+                if winreg is None:
+                    raise OSError("winreg is not available on this platform")
                 
-                if result.returncode == 0 and result.stdout.strip():
-                    entries = []
-                    lines = result.stdout.split('\\n')
-                    current_key = ""
-                    
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('HKEY_'):
-                            current_key = line
-                        elif 'NPU' in line.upper() and current_key:
-                            entries.append(f"{current_key}: {line}")
-                    
-                    if entries:
-                        npu_entries[reg_path] = entries
-                        print(f"    Found {len(entries)} NPU-related entries")
-                        for entry in entries[:3]:  # Show first 3
-                            print(f"      {entry}")
-                        if len(entries) > 3:
-                            print(f"      ... and {len(entries) - 3} more")
+                entries = []
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, subkey, 0,
+                                    winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as key:
+                    self._walk_registry(key, f"HKEY_LOCAL_MACHINE\\{subkey}", max_depth, entries)
+                
+                if entries:
+                    npu_entries[reg_path] = entries
+                    out(f"    Found {len(entries)} NPU-related entries")
+                    for entry in entries[:3]:  # Show first 3
+                        out(f"      {entry}")
+                    if len(entries) > 3:
+                        out(f"      ... and {len(entries) - 3} more")
                 
             except Exception as e:
-                print(f"    Error checking {reg_path}: {e}")
+                out(f"    Error checking {reg_path}: {e}")
         
         return npu_entries
     
-    def suggest_npu_activation_steps(self) -> List[str]:
-        """NPU有効化手順の提案"""
-        suggestions = [
-            "🔧 NPU Activation Troubleshooting Steps:",
-            "",
-            "1. **Update Intel Graphics Driver**:",
-            "   - Download latest driver from Intel website",
-            "   - Ensure driver supports Intel AI Boost NPU",
-            "   - Reboot after installation",
-            "",
-            "2. **Enable NPU in BIOS/UEFI**:",
-            "   - Enter BIOS/UEFI settings during boot",
-            "   - Look for 'Intel AI Boost', 'NPU', or 'Neural Processing' options",
-            "   - Enable if found and save settings",
-            "",
-            "3. **Windows Settings**:",
-            "   - Check Device Manager for NPU device status",
-            "   - Update device drivers if showing warnings",
-            "   - Restart Windows Update service",
-            "",
-            "4. **Intel Software**:",
-            "   - Install Intel Arc & Iris Xe Graphics software",
-            "   - Check for Intel AI acceleration settings",
-            "   - Verify OpenVINO or Intel Distribution for Python support",
-            "",
-            "5. **Test NPU Access**:",
-            "   - Run AI applications that support NPU acceleration",
-            "   - Check DirectML device enumeration",
-            "   - Test with Intel OpenVINO samples",
-            "",
-            "6. **Administrative Access**:",
-            "   - Run ETW monitoring as Administrator",
-            "   - Ensure proper permissions for hardware access",
-            "   - Check Windows Security policies"
-        ]
+    @staticmethod
+    def _walk_registry(key, path: str, max_depth: int, entries: List[str], depth: int = 0):
+        """
+        レジストリキー配下を調べ、名前または値にNPUを含むREG_SZ値を集める
+        
+        Args:
+            key: 開いているレジストリキー
+            path: 表示用のキーのフルパス
+            max_depth: サブキーをたどる最大の深さ
+            entries: 見つかったエントリの追加先
+            depth: 現在の深さ
+        """
+        subkey_count, value_count, _ = winreg.QueryInfoKey(key)
         
-        return suggestions
+        for index in range(value_count):
+            try:
+                name, data, value_type = winreg.EnumValue(key, index)
+            except OSError:
+                break
+            if value_type == winreg.REG_SZ and ('NPU' in name.upper() or 'NPU' in data.upper()):
+                entries.append(f"{path}: {name or '(Default)'}    REG_SZ    {data}")
+        
+        if depth >= max_depth:
+            return
+        
+        for index in range(subkey_count):
+            try:
+                subkey_name = winreg.EnumKey(key, index)
+                with winreg.OpenKey(key, subkey_name, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as subkey:
+                    NPUDriverInvestigator._walk_registry(
+                        subkey, f"{path}\\{subkey_name}", max_depth, entries, depth + 1
+                    )
+            except OSError:
+                # アクセスが拒否されたキーや列挙中に削除されたキーは飛ばす
+                continue
+    
+    def suggest_npu_activation_steps(self) -> str:
+        """NPU有効化手順の提案"""
+        return NPU_ACTIVATION_STEPS
     
     def comprehensive_npu_driver_investigation(self):
         """包括的NPUドライバー調査"""
@@ -292,76 +700,104 @@ class NPUDriverInvestigator:
         print(" COMPREHENSIVE NPU DRIVER & SERVICE INVESTIGATION")
         print("=" * 80)
         
+        # 出力はフェーズごとにバッファし、最後に決まった順序で表示する
+        phases = [
+            ("services", " NPU SERVICES", self.discover_npu_services),
+            ("devices", " NPU DEVICES", self.check_npu_device_status),
+            ("graphics", " INTEL GRAPHICS DRIVER", self.check_intel_graphics_driver),
+            ("driver_files", " NPU DRIVER FILES", self.check_npu_driver_files),
+            ("registry", " REGISTRY ENTRIES", self.check_registry_npu_entries),
+        ]
+        phase_funcs = {name: func for name, _, func in phases}
+        buffers: Dict[str, List[str]] = {name: [] for name, _, _ in phases}
+        futures = {}
+        
+        # フェーズは段階的に実行する（GPU → サービス・デバイス → ドライバーファイル・レジストリ）。
+        # 前の段の結果を見てから次の段を投入するため、同時に動くのは各段のフェーズと管理者権限の確認だけ
+        with ThreadPoolExecutor(max_workers=INVESTIGATION_MAX_WORKERS, thread_name_prefix="npu-investigation") as executor:
+            def submit(*names: str):
+                for name in names:
+                    futures[name] = executor.submit(phase_funcs[name], buffers[name].append)
+            
+            admin_future = executor.submit(self.check_administrator_privileges)
+            
+            submit("graphics")
+            graphics_result = futures["graphics"].result()
+            if graphics_result is None:
+                # インベントリの問い合わせ自体が失敗した場合はGPUの有無が分からないため、
+                # インベントリを使わないドライバーファイルとレジストリの調査だけ行う
+                submit("driver_files", "registry")
+            elif graphics_result:
+                submit("services", "devices")
+                # ドライバーファイルとレジストリは検出済みNPUデバイスのトラブルシュート用
+                if futures["devices"].result():
+                    submit("driver_files", "registry")
+            # Intel GPUが無いと確認できたシステムにIntel NPUは無いため、以降の調査は行わない
+        
         # 管理者権限確認
-        is_admin = self.check_administrator_privileges()
+        is_admin = admin_future.result()
         print(f"Administrator privileges: {'✅ Yes' if is_admin else '⚠ No (some checks may be limited)'}")
         
-        # 1. NPU関連サービス確認
-        print(f"\\n{'='*60}")
-        print(" NPU SERVICES")
-        print(f"{'='*60}")
-        npu_services = self.discover_npu_services()
-        self.npu_related_services = npu_services
+        results = {}
+        for name, title, _ in phases:
+            if name not in futures:
+                continue
+            print(f"\n{'='*60}")
+            print(title)
+            print(f"{'='*60}")
+            for line in buffers[name]:
+                print(line)
+            results[name] = futures[name].result()
         
-        # 2. NPUデバイス状態確認
-        print(f"\\n{'='*60}")
-        print(" NPU DEVICES")
-        print(f"{'='*60}")
-        npu_devices = self.check_npu_device_status()
+        npu_services = results.get("services", [])
+        npu_devices = results.get("devices", [])
+        graphics_info = results["graphics"]
+        self.npu_related_services = npu_services
         self.npu_devices = npu_devices
         
-        # 3. Intel グラフィックスドライバー確認
-        print(f"\\n{'='*60}")
-        print(" INTEL GRAPHICS DRIVER")
-        print(f"{'='*60}")
-        graphics_info = self.check_intel_graphics_driver()
-        
-        # 4. NPUドライバーファイル確認
-        print(f"\\n{'='*60}")
-        print(" NPU DRIVER FILES")
-        print(f"{'='*60}")
-        driver_files = self.check_npu_driver_files()
-        
-        # 5. レジストリエントリ確認
-        print(f"\\n{'='*60}")
-        print(" REGISTRY ENTRIES")
-        print(f"{'='*60}")
-        registry_entries = self.check_registry_npu_entries()
+        def count(name: str) -> str:
+            return str(len(results[name])) if name in results else "skipped"
         
         # 結果サマリー
-        print(f"\\n{'='*80}")
+        print(f"\n{'='*80}")
         print(" INVESTIGATION SUMMARY")
         print(f"{'='*80}")
         
         print(f"📊 Results Summary:")
-        print(f"  NPU Services found: {len(npu_services)}")
-        print(f"  NPU Devices found: {len(npu_devices)}")
-        print(f"  Intel Graphics driver: {'✅ Found' if graphics_info else '❌ Not found'}")
-        print(f"  NPU Driver files: {len(driver_files)}")
-        print(f"  Registry entries: {len(registry_entries)}")
+        print(f"  NPU Services found: {count('services')}")
+        print(f"  NPU Devices found: {count('devices')}")
+        if graphics_info is None:
+            print(f"  Intel Graphics driver: ⚠ Unknown (inventory query failed)")
+        else:
+            print(f"  Intel Graphics driver: {'✅ Found' if graphics_info else '❌ Not found'}")
+        print(f"  NPU Driver files: {count('driver_files')}")
+        print(f"  Registry entries: {count('registry')}")
         
         # 問題診断
         issues = []
-        if not npu_services:
-            issues.append("No NPU-related services found")
-        if not npu_devices:
-            issues.append("No NPU devices detected")
-        if not graphics_info:
-            issues.append("Intel graphics driver not detected")
+        if self.inventory_degraded:
+            issues.append(f"WMI query took longer than {INVENTORY_FAST_TIMEOUT_SEC}s (slow or broken WMI provider)")
+        if graphics_info is None:
+            issues.append("Inventory query failed — Intel GPU / NPU presence unknown (check the WMI service)")
+        elif not graphics_info:
+            issues.append("No Intel GPU — NPU not applicable")
+        else:
+            if not npu_services:
+                issues.append("No NPU-related services found")
+            if not npu_devices:
+                issues.append("No NPU devices detected")
         
         if issues:
-            print(f"\\n⚠ Potential Issues:")
+            print(f"\n⚠ Potential Issues:")
             for issue in issues:
                 print(f"  - {issue}")
         
         # NPU有効化手順の提案
-        print(f"\\n{'='*60}")
+        print(f"\n{'='*60}")
         print(" NPU ACTIVATION RECOMMENDATIONS")
         print(f"{'='*60}")
         
-        suggestions = self.suggest_npu_activation_steps()
-        for suggestion in suggestions:
-            print(suggestion)
+        print(self.suggest_npu_activation_steps())
 
 def main():
     """メイン関数"""
@@ -370,7 +806,10 @@ def main():
     print()
     
     investigator = NPUDriverInvestigator()
-    investigator.comprehensive_npu_driver_investigation()
+    try:
+        investigator.comprehensive_npu_driver_investigation()
+    finally:
+        investigator.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
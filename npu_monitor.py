@@ -4,9 +4,14 @@ NPU専用監視スクリプト
 NPUエンジンの使用率とAI推論活動を専門的に監視します
 """
 
+import bisect
+import ctypes
+import itertools
 import time
 import psutil
 import math
+import re
+import queue
 import threading
 from collections import defaultdict, deque
 from typing import Dict, List, Tuple, Optional, Any
@@ -26,7 +31,207 @@ try:
 except Exception:
     HAS_WMI = False
 
+# WMI接続（COMオブジェクトは作成したスレッドでしか使えないため、スレッドごとに保持する）
+_wmi_local = threading.local()
+
+def _get_wmi():
+    """呼び出し元スレッドのWMI接続を返す（初回だけCOM初期化と接続を行う）"""
+    conn = getattr(_wmi_local, 'conn', None)
+    if conn is None:
+        import pythoncom  # pywin32（wmiの依存）に含まれる
+        # 既に初期化済みのスレッドでは何もしない。接続はスレッドの終了まで保持する
+        pythoncom.CoInitialize()
+        conn = wmi.WMI()
+        _wmi_local.conn = conn
+    return conn
+
+# ----- ntdll for native process enumeration -----
+try:
+    _ntdll = ctypes.WinDLL('ntdll')
+    HAS_NTDLL = True
+except (AttributeError, OSError):
+    HAS_NTDLL = False
+
+# ----- SetupAPI for native device enumeration -----
+try:
+    _setupapi = ctypes.WinDLL('setupapi', use_last_error=True)
+    HAS_SETUPAPI = True
+except (AttributeError, OSError):
+    HAS_SETUPAPI = False
+
 REFRESH_SEC = 1.0
+NPU_COUNTER_PATH = r"\NPU Engine(*)\Utilization Percentage"
+# NPUカウンタを問い合わせる間隔（秒）。表示はREFRESH_SECごとに行い、間は前回値を使う
+PDH_POLL_SEC = 5.0
+# AIプロセスもNPU使用も無い収集がこの回数続くごとに収集間隔を2倍にする（最大 REFRESH_SEC * 2**IDLE_BACKOFF_MAX_SHIFT）
+IDLE_BACKOFF_TICKS = 10
+IDLE_BACKOFF_MAX_SHIFT = 3
+# 統計サマリーを表示する間隔（秒）
+SUMMARY_INTERVAL_SEC = 5 * 60
+# 統計用に保持するサンプル数と期間
+STATS_HISTORY_SIZE = 300
+STATS_WINDOW_NS = 5 * 60 * 1_000_000_000
+# 収集スレッドから表示側へ渡すメトリクスの最大保留数
+METRICS_QUEUE_SIZE = 8
+
+# NPU関連デバイスとみなす名前・説明のキーワード（小文字で照合）
+NPU_DEVICE_KEYWORDS = ('ai boost', 'npu', 'neural', 'ai accelerator', 'inference')
+INTEL_AI_BOOST_NAME = 'intel(r) ai boost'
+# 全キーワードを1回の走査で照合する
+_NPU_DEVICE_RE = re.compile('|'.join(map(re.escape, NPU_DEVICE_KEYWORDS)))
+
+# ----- SetupAPI (setupapi.h) -----
+DIGCF_PRESENT = 0x00000002
+DIGCF_ALLCLASSES = 0x00000004
+SPDRP_DEVICEDESC = 0x00000000
+SPDRP_FRIENDLYNAME = 0x0000000C
+ERROR_INSUFFICIENT_BUFFER = 122
+ERROR_NO_MORE_ITEMS = 259
+_INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+class SP_DEVINFO_DATA(ctypes.Structure):
+    _fields_ = [
+        ("cbSize", ctypes.c_uint32),
+        ("ClassGuid", ctypes.c_ubyte * 16),
+        ("DevInst", ctypes.c_uint32),
+        ("Reserved", ctypes.c_void_p),
+    ]
+
+if HAS_SETUPAPI:
+    _setupapi.SetupDiGetClassDevsW.argtypes = [ctypes.c_void_p, ctypes.c_wchar_p, ctypes.c_void_p, ctypes.c_uint32]
+    _setupapi.SetupDiGetClassDevsW.restype = ctypes.c_void_p
+    _setupapi.SetupDiEnumDeviceInfo.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(SP_DEVINFO_DATA)]
+    _setupapi.SetupDiEnumDeviceInfo.restype = ctypes.c_int
+    _setupapi.SetupDiGetDeviceRegistryPropertyW.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(SP_DEVINFO_DATA), ctypes.c_uint32,
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32)
+    ]
+    _setupapi.SetupDiGetDeviceRegistryPropertyW.restype = ctypes.c_int
+    _setupapi.SetupDiGetDeviceInstanceIdW.argtypes = [
+        ctypes.c_void_p, ctypes.POINTER(SP_DEVINFO_DATA), ctypes.c_wchar_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32)
+    ]
+    _setupapi.SetupDiGetDeviceInstanceIdW.restype = ctypes.c_int
+    _setupapi.SetupDiDestroyDeviceInfoList.argtypes = [ctypes.c_void_p]
+    _setupapi.SetupDiDestroyDeviceInfoList.restype = ctypes.c_int
+
+def _get_device_property(dev_info, devinfo_data: SP_DEVINFO_DATA, prop: int) -> str:
+    """SetupDiGetDeviceRegistryPropertyWで文字列プロパティを取得（無ければ空文字）"""
+    buffer = ctypes.create_unicode_buffer(256)
+    required = ctypes.c_uint32(0)
+    for _ in range(2):
+        if _setupapi.SetupDiGetDeviceRegistryPropertyW(
+                dev_info, ctypes.byref(devinfo_data), prop, None,
+                buffer, ctypes.sizeof(buffer), ctypes.byref(required)):
+            return buffer.value
+        if ctypes.get_last_error() != ERROR_INSUFFICIENT_BUFFER:
+            break
+        buffer = ctypes.create_unicode_buffer(required.value // ctypes.sizeof(ctypes.c_wchar) + 1)
+    return ""
+
+def enumerate_pnp_devices() -> Optional[List[Tuple[str, str, str]]]:
+    """
+    SetupAPIで接続中の全PnPデバイスを列挙（WMIを経由しない）
+    
+    Returns:
+        (名前, 説明, デバイスID) の一覧。SetupAPIが使えない場合はNone
+    """
+    if not HAS_SETUPAPI:
+        return None
+    
+    dev_info = _setupapi.SetupDiGetClassDevsW(None, None, None, DIGCF_ALLCLASSES | DIGCF_PRESENT)
+    if dev_info in (None, _INVALID_HANDLE_VALUE):
+        return None
+    
+    devices = []
+    try:
+        devinfo_data = SP_DEVINFO_DATA()
+        devinfo_data.cbSize = ctypes.sizeof(SP_DEVINFO_DATA)
+        instance_id = ctypes.create_unicode_buffer(512)
+        index = 0
+        while _setupapi.SetupDiEnumDeviceInfo(dev_info, index, ctypes.byref(devinfo_data)):
+            index += 1
+            description = _get_device_property(dev_info, devinfo_data, SPDRP_DEVICEDESC)
+            # Win32_PnPEntity.Nameと同じく、FriendlyNameが無ければ説明を名前とする
+            name = _get_device_property(dev_info, devinfo_data, SPDRP_FRIENDLYNAME) or description
+            if not _setupapi.SetupDiGetDeviceInstanceIdW(
+                    dev_info, ctypes.byref(devinfo_data), instance_id, len(instance_id), None):
+                instance_id.value = ""
+            devices.append((name, description, instance_id.value))
+        if ctypes.get_last_error() != ERROR_NO_MORE_ITEMS:
+            return None
+    finally:
+        _setupapi.SetupDiDestroyDeviceInfoList(dev_info)
+    
+    return devices
+
+# ----- NtQuerySystemInformation (winternl.h) -----
+SYSTEM_PROCESS_INFORMATION_CLASS = 5
+STATUS_SUCCESS = 0
+STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+
+class UNICODE_STRING(ctypes.Structure):
+    _fields_ = [
+        ("Length", ctypes.c_uint16),
+        ("MaximumLength", ctypes.c_uint16),
+        ("Buffer", ctypes.c_void_p),
+    ]
+
+class SYSTEM_PROCESS_INFORMATION(ctypes.Structure):
+    """先頭からUniqueProcessIdまで（以降のフィールドは使わない）"""
+    _fields_ = [
+        ("NextEntryOffset", ctypes.c_uint32),
+        ("NumberOfThreads", ctypes.c_uint32),
+        ("WorkingSetPrivateSize", ctypes.c_int64),
+        ("HardFaultCount", ctypes.c_uint32),
+        ("NumberOfThreadsHighWatermark", ctypes.c_uint32),
+        ("CycleTime", ctypes.c_uint64),
+        ("CreateTime", ctypes.c_int64),
+        ("UserTime", ctypes.c_int64),
+        ("KernelTime", ctypes.c_int64),
+        ("ImageName", UNICODE_STRING),
+        ("BasePriority", ctypes.c_int32),
+        ("UniqueProcessId", ctypes.c_void_p),
+    ]
+
+if HAS_NTDLL:
+    _ntdll.NtQuerySystemInformation.argtypes = [ctypes.c_uint32, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32)]
+    _ntdll.NtQuerySystemInformation.restype = ctypes.c_uint32
+
+def snapshot_processes() -> Optional[List[Tuple[int, str]]]:
+    """
+    NtQuerySystemInformationで全プロセスのPIDと実行ファイル名を1回の呼び出しで取得
+    
+    Returns:
+        (PID, 実行ファイル名) の一覧。ntdllが使えない場合はNone
+    """
+    if not HAS_NTDLL:
+        return None
+    
+    size = ctypes.c_uint32(256 * 1024)
+    while True:
+        buffer = ctypes.create_string_buffer(size.value)
+        status = _ntdll.NtQuerySystemInformation(
+            SYSTEM_PROCESS_INFORMATION_CLASS, buffer, size.value, ctypes.byref(size))
+        if status == STATUS_INFO_LENGTH_MISMATCH:
+            # 呼び出しの間にプロセスが増えることがあるため余裕を持たせる
+            size.value += 64 * 1024
+            continue
+        if status != STATUS_SUCCESS:
+            return None
+        break
+    
+    processes = []
+    offset = 0
+    while True:
+        info = SYSTEM_PROCESS_INFORMATION.from_buffer(buffer, offset)
+        image_name = info.ImageName
+        name = ctypes.wstring_at(image_name.Buffer, image_name.Length // 2) if image_name.Buffer else ""
+        processes.append((info.UniqueProcessId or 0, name))
+        if not info.NextEntryOffset:
+            break
+        offset += info.NextEntryOffset
+    
+    return processes
 
 class NPUDeviceDetector:
     """NPUデバイス検出・情報取得クラス"""
@@ -35,34 +240,69 @@ class NPUDeviceDetector:
         self.intel_ai_boost_detected = False
         self.npu_devices = []
         self.detection_results = {}
+        self._pnp_snapshot: List[Tuple[str, str, str]] = []
         self._scan_devices()
     
     def _scan_devices(self):
         """システム内のNPUデバイスをスキャン"""
+        intel_ai_boost, npu_devices = self._scan_pnp_devices()
         self.detection_results = {
-            'intel_ai_boost': self._detect_intel_ai_boost(),
+            'intel_ai_boost': intel_ai_boost,
             'npu_counters': self._check_npu_counters(),
-            'npu_devices': self._scan_npu_devices()
+            'npu_devices': npu_devices
         }
         
         self.intel_ai_boost_detected = self.detection_results['intel_ai_boost']
         self.npu_devices = self.detection_results['npu_devices']
     
-    def _detect_intel_ai_boost(self) -> bool:
-        """Intel AI Boost NPUを検出"""
+    def _snapshot_pnp_devices(self) -> List[Tuple[str, str, str]]:
+        """PnPデバイス一覧を取得（名前, 説明, デバイスID）。SetupAPIが使えなければWMIを使用"""
+        devices = enumerate_pnp_devices()
+        if devices is not None:
+            return devices
+        
         if not HAS_WMI:
-            return False
+            return []
         
         try:
-            c = wmi.WMI()
-            devices = c.Win32_PnPEntity()
-            for device in devices:
-                device_name = str(getattr(device, 'Name', ''))
-                if 'Intel(R) AI Boost' in device_name:
-                    return True
+            c = _get_wmi()
+            return [
+                (str(getattr(device, 'Name', '')),
+                 str(getattr(device, 'Description', '')),
+                 str(getattr(device, 'DeviceID', '')))
+                for device in c.Win32_PnPEntity()
+            ]
         except Exception:
-            pass
-        return False
+            return []
+    
+    def _scan_pnp_devices(self) -> Tuple[bool, List[Dict[str, str]]]:
+        """
+        PnPデバイスを1回だけ列挙し、Intel AI Boostの有無とNPU関連デバイスを調べる
+        
+        Returns:
+            (Intel AI Boostを検出したか, NPU関連デバイスの一覧)
+        """
+        # 列挙結果は保持しておき、他の検出処理から再利用できるようにする
+        self._pnp_snapshot = self._snapshot_pnp_devices()
+        
+        intel_ai_boost = False
+        npu_devices = []
+        
+        for device_name, device_desc, device_id in self._pnp_snapshot:
+            name_lc = device_name.lower()
+            desc_lc = device_desc.lower()
+            
+            if INTEL_AI_BOOST_NAME in name_lc:
+                intel_ai_boost = True
+            
+            if _NPU_DEVICE_RE.search(name_lc) or _NPU_DEVICE_RE.search(desc_lc):
+                npu_devices.append({
+                    'name': device_name,
+                    'description': device_desc,
+                    'device_id': device_id
+                })
+        
+        return intel_ai_boost, npu_devices
     
     def _check_npu_counters(self) -> bool:
         """NPU Performance Countersの利用可能性をチェック"""
@@ -70,41 +310,11 @@ class NPUDeviceDetector:
             return False
         
         try:
-            paths = win32pdh.ExpandCounterPath(r"\NPU Engine(*)\Utilization Percentage")
+            paths = win32pdh.ExpandCounterPath(NPU_COUNTER_PATH)
             return bool(paths)
         except Exception:
             return False
     
-    def _scan_npu_devices(self) -> List[Dict[str, str]]:
-        """WMI経由でNPU関連デバイスをスキャン"""
-        if not HAS_WMI:
-            return []
-        
-        npu_devices = []
-        npu_keywords = ['ai boost', 'npu', 'neural', 'ai accelerator', 'inference']
-        
-        try:
-            c = wmi.WMI()
-            devices = c.Win32_PnPEntity()
-            
-            for device in devices:
-                device_name = str(getattr(device, 'Name', ''))
-                device_desc = str(getattr(device, 'Description', ''))
-                device_id = str(getattr(device, 'DeviceID', ''))
-                
-                for keyword in npu_keywords:
-                    if keyword.lower() in device_name.lower() or keyword.lower() in device_desc.lower():
-                        npu_devices.append({
-                            'name': device_name,
-                            'description': device_desc,
-                            'device_id': device_id
-                        })
-                        break
-        except Exception:
-            pass
-        
-        return npu_devices
-    
     def print_detection_status(self):
         """NPU検出状況を表示"""
         print("=" * 60)
@@ -137,8 +347,11 @@ class NPUPerformanceCollector:
     
     def __init__(self):
         self.query = None
+        self.wildcard_counter = None
         self.counters = []
         self._available = False
+        # 直近のサンプル（PDH_POLL_SEC以内の呼び出しではこれを返す）
+        self._last_sample: Optional[Tuple[int, Dict[str, float]]] = None
         self._try_build()
     
     def _try_build(self):
@@ -147,21 +360,32 @@ class NPUPerformanceCollector:
             return
         
         try:
-            paths = win32pdh.ExpandCounterPath(r"\NPU Engine(*)\Utilization Percentage")
+            paths = win32pdh.ExpandCounterPath(NPU_COUNTER_PATH)
             if not paths:
                 return
             
             self.query = win32pdh.OpenQuery()
             self.counters = []
             
-            for path in paths:
+            # ワイルドカードのまま1カウンターとして登録し、全インスタンスを一括取得する
+            if hasattr(win32pdh, 'GetFormattedCounterArray'):
                 try:
-                    handle = win32pdh.AddCounter(self.query, path)
-                    self.counters.append((handle, path))
+                    self.wildcard_counter = win32pdh.AddCounter(self.query, NPU_COUNTER_PATH)
                 except Exception:
-                    pass
+                    self.wildcard_counter = None
             
-            if self.counters:
+            # 古いpywin32向けのフォールバック: インスタンスを展開して個別に登録
+            if self.wildcard_counter is None:
+                for path in paths:
+                    try:
+                        handle = win32pdh.AddCounter(self.query, path)
+                    except Exception:
+                        continue
+                    # インスタンス名はパスごとに固定なので、登録時に一度だけ抽出する
+                    instance = path[path.find('(')+1:path.find(')')] if '(' in path and ')' in path else path
+                    self.counters.append((handle, instance))
+            
+            if self.wildcard_counter is not None or self.counters:
                 win32pdh.CollectQueryData(self.query)
                 self._available = True
         except Exception:
@@ -171,21 +395,44 @@ class NPUPerformanceCollector:
         """NPU Countersが利用可能かどうか"""
         return self._available
     
-    def collect(self) -> Dict[str, float]:
-        """NPU使用率データを収集"""
+    def collect(self) -> Tuple[int, Dict[str, float]]:
+        """
+        NPU使用率データを収集
+        
+        Returns:
+            (サンプル時刻 [time.monotonic_ns()], インスタンス名 -> 使用率)
+        """
         if not self._available:
-            return {}
+            return time.monotonic_ns(), {}
+        
+        if self._last_sample is not None and time.monotonic_ns() - self._last_sample[0] < PDH_POLL_SEC * 1_000_000_000:
+            return self._last_sample
         
+        self._last_sample = self._poll()
+        return self._last_sample
+    
+    def _poll(self) -> Tuple[int, Dict[str, float]]:
+        """PDHからNPU使用率を取得"""
         try:
-            time.sleep(0.2)
+            # 前回のCollectQueryData（初回は_try_build）からの差分で値が計算される
             win32pdh.CollectQueryData(self.query)
+            # サンプル時刻はカウンタ値を確定させた直後に記録する
+            sample_ns = time.monotonic_ns()
+            
+            if self.wildcard_counter is not None:
+                values = win32pdh.GetFormattedCounterArray(self.wildcard_counter, win32pdh.PDH_FMT_DOUBLE)
+                # 有効な値のみ採用
+                data = {
+                    instance: float(val) for instance, val in values.items()
+                    if not math.isnan(val) and val >= 0
+                }
+                return sample_ns, data
+            
             data = {}
             
-            for handle, path in self.counters:
+            for handle, instance in self.counters:
                 try:
                     t, val = win32pdh.GetFormattedCounterValue(handle, win32pdh.PDH_FMT_DOUBLE)
-                    # インスタンス名を抽出
-                    instance = path[path.find('(')+1:path.find(')')] if '(' in path and ')' in path else path
                     
                     # 有効な値のみ追加
                     numeric_val = float(val)
@@ -194,9 +441,20 @@ class NPUPerformanceCollector:
                 except Exception:
                     pass
             
-            return data
+            return sample_ns, data
         except Exception:
-            return {}
+            return time.monotonic_ns(), {}
+
+def _keyword_priority_re(keywords: List[str]) -> "re.Pattern[str]":
+    """
+    キーワードを1回の照合で探す正規表現を作成
+    
+    リストの順番を優先度とし、一致したキーワードは match.group(match.lastindex) で取得できる
+    """
+    return re.compile(
+        '^(?:' + '|'.join(f'(?=.*?({re.escape(keyword)}))' for keyword in keywords) + ')',
+        re.DOTALL
+    )
 
 class AIProcessDetector:
     """AI推論プロセス検出クラス"""
@@ -211,47 +469,66 @@ class AIProcessDetector:
         self.ai_command_patterns = [
             'onnx', 'torch', 'tensorflow', 'ml', 'ai', 'neural', 'inference'
         ]
+        
+        self._ai_process_re = _keyword_priority_re(self.ai_process_patterns)
+        self._ai_command_re = _keyword_priority_re(self.ai_command_patterns)
+        # PID -> (create_time, AIプロセスか, 種別)。コマンドラインはプロセスが同じ間は変わらない
+        self._cmdline_cache: Dict[int, Tuple[float, bool, str]] = {}
+        # PID -> psutil.Process（ネイティブ列挙時に使用）
+        self._process_cache: Dict[int, "psutil.Process"] = {}
+        # PID -> (monotonic時刻, CPU時間の合計)。CPU使用率を前回との差分で計算する
+        self._prev_cpu: Dict[int, Tuple[float, float]] = {}
+        self._cpu_count = psutil.cpu_count(logical=True) or 1
     
     def detect_active_ai_processes(self) -> List[Dict[str, Any]]:
         """現在アクティブなAI関連プロセスを検出"""
         ai_processes = []
+        cmdline_pids = set()
+        ai_pids = set()
         
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+            # Windowsでは1回のシステムコールで名前とPIDを取得し、
+            # psutil.Processは名前で絞り込んだプロセスに対してだけ作る
+            native_processes = snapshot_processes()
+            if native_processes is not None:
+                candidates = ((pid, name, None) for pid, name in native_processes)
+            else:
+                candidates = (
+                    (proc.info['pid'], proc.info['name'], proc)
+                    for proc in psutil.process_iter(['pid', 'name'])
+                )
+            
+            for pid, name, proc in candidates:
                 try:
-                    proc_info = proc.info
-                    proc_name = proc_info['name'].lower()
+                    proc_name = (name or '').lower()
                     
                     is_ai_process = False
                     ai_type = "Unknown"
                     
                     # プロセス名での検出
-                    for pattern in self.ai_process_patterns:
-                        if pattern in proc_name:
-                            is_ai_process = True
-                            ai_type = pattern.capitalize()
-                            break
+                    match = self._ai_process_re.search(proc_name)
+                    if match:
+                        is_ai_process = True
+                        ai_type = match.group(match.lastindex).capitalize()
                     
                     # Pythonプロセスの場合、コマンドラインを確認
                     if 'python' in proc_name and not is_ai_process:
                         try:
-                            cmdline = proc.cmdline()
-                            cmdline_str = ' '.join(cmdline).lower()
-                            for pattern in self.ai_command_patterns:
-                                if pattern in cmdline_str:
-                                    is_ai_process = True
-                                    ai_type = f"Python ({pattern})"
-                                    break
+                            proc = proc or self._get_process(pid)
+                            is_ai_process, ai_type = self._classify_cmdline(proc)
+                            cmdline_pids.add(pid)
                         except (psutil.AccessDenied, psutil.NoSuchProcess):
                             pass
                     
                     if is_ai_process:
+                        proc = proc or self._get_process(pid)
+                        ai_pids.add(pid)
                         ai_processes.append({
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
+                            'pid': pid,
+                            'name': name,
                             'type': ai_type,
-                            'cpu_percent': proc_info['cpu_percent'],
-                            'memory_percent': proc_info['memory_percent']
+                            'cpu_percent': self._cpu_percent(proc),
+                            'memory_percent': proc.memory_percent()
                         })
                         
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
@@ -259,15 +536,169 @@ class AIProcessDetector:
         except Exception:
             pass
         
+        # 終了したプロセスのキャッシュを捨てる
+        if len(self._cmdline_cache) > len(cmdline_pids):
+            self._cmdline_cache = {pid: entry for pid, entry in self._cmdline_cache.items() if pid in cmdline_pids}
+        seen_pids = ai_pids | cmdline_pids
+        if len(self._process_cache) > len(seen_pids):
+            self._process_cache = {pid: proc for pid, proc in self._process_cache.items() if pid in seen_pids}
+        if len(self._prev_cpu) > len(ai_pids):
+            self._prev_cpu = {pid: entry for pid, entry in self._prev_cpu.items() if pid in ai_pids}
+        
         return ai_processes
+    
+    def _get_process(self, pid: int) -> "psutil.Process":
+        """
+        psutil.Processを取得（プロセスが生きている間は同じオブジェクトを使い続ける）
+        """
+        proc = self._process_cache.get(pid)
+        if proc is None or not proc.is_running():
+            proc = psutil.Process(pid)
+            self._process_cache[pid] = proc
+        return proc
+    
+    def _cpu_percent(self, proc) -> float:
+        """
+        前回呼び出しからのCPU時間（user+system）の増分でCPU使用率を計算
+        
+        初めて見たプロセスは起動時からの平均を返すため、1回目から0にならない
+        
+        Returns:
+            全論理コアに対する使用率（%）
+        """
+        now = time.monotonic()
+        times = proc.cpu_times()
+        cpu_time = times.user + times.system
+        
+        prev = self._prev_cpu.get(proc.pid)
+        self._prev_cpu[proc.pid] = (now, cpu_time)
+        if prev is not None and cpu_time >= prev[1]:
+            elapsed = now - prev[0]
+            cpu_delta = cpu_time - prev[1]
+        else:
+            # 初回（またはPIDが再利用された場合）は起動時刻からの平均
+            elapsed = time.time() - proc.create_time()
+            cpu_delta = cpu_time
+        
+        if elapsed <= 0:
+            return 0.0
+        return min(100.0, 100.0 * cpu_delta / (elapsed * self._cpu_count))
+    
+    def _classify_cmdline(self, proc) -> Tuple[bool, str]:
+        """
+        コマンドラインからAIプロセスかどうかを判定（同じプロセスの間は結果を再利用）
+        
+        Returns:
+            (AIプロセスか, 種別)
+        """
+        pid = proc.pid
+        create_time = proc.create_time()
+        cached = self._cmdline_cache.get(pid)
+        if cached is not None and cached[0] == create_time:
+            return cached[1], cached[2]
+        
+        cmdline_str = ' '.join(proc.cmdline()).lower()
+        match = self._ai_command_re.search(cmdline_str)
+        result = (True, f"Python ({match.group(match.lastindex)})") if match else (False, "Unknown")
+        self._cmdline_cache[pid] = (create_time, *result)
+        return result
+
+class RunningMean:
+    """固定長の履歴と合計を保持し、平均をO(1)で返す"""
+    
+    def __init__(self, maxlen: int):
+        self._values: deque = deque(maxlen=maxlen)
+        self._sum = 0.0
+    
+    def append(self, value: float):
+        if len(self._values) == self._values.maxlen:
+            self._sum -= self._values[0]
+        self._values.append(value)
+        self._sum += value
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def mean(self) -> float:
+        return self._sum / len(self._values) if self._values else 0.0
+
+class TimedWindow:
+    """
+    タイムスタンプと値の履歴を保持し、合計・正値の件数・最大値を追加/削除時に更新する
+    
+    タイムスタンプと値は別々のdequeに持ち、サンプルごとのタプルを作らない。
+    
+    最大値は単調減少キューで管理し、ウィンドウ全体の統計をO(1)で返す
+    """
+    
+    def __init__(self, maxlen: int, max_age_ns: int):
+        self.maxlen = maxlen
+        self.max_age_ns = max_age_ns
+        self._times: deque = deque()  # time.monotonic_ns()（単調増加）
+        self._values: deque = deque()
+        self._sum = 0.0
+        self._positive_sum = 0.0
+        self._positive_count = 0
+        # 値が単調減少する (通し番号, 値)。NPUの値は同じタイムスタンプが続くことがあるため通し番号で識別する
+        self._max: deque = deque()
+        self._appended = 0
+        self._removed = 0
+    
+    def append(self, t_ns: int, value: float):
+        self._times.append(t_ns)
+        self._values.append(value)
+        self._sum += value
+        if value > 0:
+            self._positive_sum += value
+            self._positive_count += 1
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self._appended, value))
+        self._appended += 1
+        
+        while len(self._values) > self.maxlen:
+            self._popleft()
+        self.expire(t_ns - self.max_age_ns)
+    
+    def expire(self, cutoff_ns: int):
+        """cutoff_ns以前のサンプルを捨てる"""
+        while self._times and self._times[0] <= cutoff_ns:
+            self._popleft()
+    
+    def _popleft(self):
+        self._times.popleft()
+        value = self._values.popleft()
+        self._sum -= value
+        if value > 0:
+            self._positive_sum -= value
+            self._positive_count -= 1
+        if self._max and self._max[0][0] == self._removed:
+            self._max.popleft()
+        self._removed += 1
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def values_since(self, cutoff_ns: int) -> List[float]:
+        """cutoff_nsより後のサンプルの値を返す（開始位置は二分探索で求める）"""
+        start = bisect.bisect_right(self._times, cutoff_ns)
+        return list(itertools.islice(self._values, start, None))
+    
+    def oldest_ns(self) -> Optional[int]:
+        return self._times[0] if self._times else None
+    
+    def summary(self) -> Tuple[int, float, int, float, float]:
+        """(件数, 合計, 正値の件数, 正値の合計, 最大値) を返す"""
+        max_value = self._max[0][1] if self._max else 0.0
+        return len(self._values), self._sum, self._positive_count, self._positive_sum, max_value
 
 class NPUUsageEstimator:
     """NPU使用率推定クラス"""
     
     def __init__(self, history_size=60):
-        self.cpu_baseline = deque(maxlen=history_size)
-        self.cpu_during_ai = deque(maxlen=history_size)
-        self.ai_process_count = deque(maxlen=history_size)
+        self.cpu_baseline = RunningMean(history_size)
+        self.cpu_during_ai = RunningMean(history_size)
+        self.ai_process_count = RunningMean(history_size)
         
     def update_baseline(self, cpu_percent: float):
         """AI非アクティブ時のCPUベースライン更新"""
@@ -283,9 +714,9 @@ class NPUUsageEstimator:
         if len(self.cpu_baseline) < 10 or len(self.cpu_during_ai) < 5:
             return None
         
-        baseline_avg = sum(self.cpu_baseline) / len(self.cpu_baseline)
-        ai_avg = sum(self.cpu_during_ai) / len(self.cpu_during_ai)
-        avg_ai_processes = sum(self.ai_process_count) / len(self.ai_process_count)
+        baseline_avg = self.cpu_baseline.mean()
+        ai_avg = self.cpu_during_ai.mean()
+        avg_ai_processes = self.ai_process_count.mean()
         
         if baseline_avg <= 0:
             return None
@@ -321,14 +752,23 @@ class NPUMonitor:
         
         # 統計データ
         self.stats = {
-            'npu_usage': deque(maxlen=300),  # 5分間の履歴
-            'ai_activity': deque(maxlen=300),
-            'cpu_usage': deque(maxlen=300)
+            'npu_usage': TimedWindow(STATS_HISTORY_SIZE, STATS_WINDOW_NS),  # 5分間の履歴
+            'ai_activity': TimedWindow(STATS_HISTORY_SIZE, STATS_WINDOW_NS),
+            'cpu_usage': TimedWindow(STATS_HISTORY_SIZE, STATS_WINDOW_NS)
         }
         
-        # 監視状態
+        # 監視状態（収集はmonitor_threadで行い、表示はメインスレッドで行う）
         self.monitoring = False
         self.monitor_thread = None
+        self._metrics_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=METRICS_QUEUE_SIZE)
+        self._stop_event = threading.Event()
+        # statsは収集スレッドが追加し、メインスレッドが統計計算で読む
+        self._stats_lock = threading.Lock()
+        # 最後にstatsへ記録したNPUサンプルの時刻
+        self._last_npu_sample_ns: Optional[int] = None
+        # アイドル時の収集間隔の調整（収集スレッドのみが使用）
+        self._idle_streak = 0
+        self._cur_interval = REFRESH_SEC
     
     def print_header(self):
         """ヘッダー情報を表示"""
@@ -354,8 +794,8 @@ class NPUMonitor:
     
     def collect_metrics(self) -> Dict[str, Any]:
         """各種メトリクスを収集"""
-        # NPU パフォーマンスカウンター
-        npu_data = self.npu_collector.collect()
+        # NPU パフォーマンスカウンター（PDH_POLL_SEC以内なら前回値）
+        sample_ns, npu_data = self.npu_collector.collect()
         
         # AI プロセス検出
         ai_processes = self.ai_detector.detect_active_ai_processes()
@@ -384,14 +824,21 @@ class NPUMonitor:
         # 推定値取得
         npu_estimate = self.usage_estimator.estimate_npu_usage()
         
-        # データ統計更新
+        # データ統計更新（統計はモノトニック時刻、timestampは表示用）
+        # NPUはPDHのサンプル時刻、AIプロセスとCPUはこの収集時刻で記録する
         timestamp = time.time()
-        self.stats['npu_usage'].append((timestamp, npu_usage))
-        self.stats['ai_activity'].append((timestamp, len(ai_processes)))
-        self.stats['cpu_usage'].append((timestamp, cpu_percent))
+        now_ns = time.monotonic_ns()
+        with self._stats_lock:
+            # PDH_POLL_SEC以内は同じサンプルが返るため、新しいサンプルのときだけ記録する
+            if sample_ns != self._last_npu_sample_ns:
+                self.stats['npu_usage'].append(sample_ns, npu_usage)
+                self._last_npu_sample_ns = sample_ns
+            self.stats['ai_activity'].append(now_ns, len(ai_processes))
+            self.stats['cpu_usage'].append(now_ns, cpu_percent)
         
         return {
             'timestamp': timestamp,
+            'sample_ns': sample_ns,
             'npu_usage': npu_usage,
             'npu_engines': npu_engines,
             'npu_estimate': npu_estimate,
@@ -443,29 +890,71 @@ class NPUMonitor:
     
     def calculate_statistics(self, minutes: int = 5) -> Dict[str, Any]:
         """指定時間内の統計を計算"""
-        cutoff_time = time.time() - (minutes * 60)
-        
-        # NPU使用率統計
-        recent_npu = [(t, v) for t, v in self.stats['npu_usage'] if t > cutoff_time]
-        npu_values = [v for t, v in recent_npu if v > 0]
+        cutoff_ns = time.monotonic_ns() - minutes * 60 * 1_000_000_000
         
-        # AI活動統計
-        recent_ai = [(t, v) for t, v in self.stats['ai_activity'] if t > cutoff_time]
-        ai_active_ratio = len([v for t, v in recent_ai if v > 0]) / len(recent_ai) if recent_ai else 0
-        
-        # CPU統計
-        recent_cpu = [(t, v) for t, v in self.stats['cpu_usage'] if t > cutoff_time]
-        cpu_values = [v for t, v in recent_cpu]
+        with self._stats_lock:
+            npu_count, _, npu_positive, npu_sum, npu_max = self._window_summary('npu_usage', cutoff_ns)
+            ai_count, _, ai_active, _, _ = self._window_summary('ai_activity', cutoff_ns)
+            cpu_count, cpu_sum, _, _, _ = self._window_summary('cpu_usage', cutoff_ns)
         
         return {
             'period_minutes': minutes,
-            'npu_avg': sum(npu_values) / len(npu_values) if npu_values else 0,
-            'npu_max': max(npu_values) if npu_values else 0,
-            'ai_active_ratio': ai_active_ratio * 100,
-            'cpu_avg': sum(cpu_values) / len(cpu_values) if cpu_values else 0,
-            'sample_count': len(recent_npu)
+            'npu_avg': npu_sum / npu_positive if npu_positive else 0,
+            'npu_max': npu_max if npu_positive else 0,
+            'ai_active_ratio': ai_active / ai_count * 100 if ai_count else 0,
+            'cpu_avg': cpu_sum / cpu_count if cpu_count else 0,
+            'sample_count': npu_count
         }
     
+    def _window_summary(self, key: str, cutoff_ns: int) -> Tuple[int, float, int, float, float]:
+        """
+        cutoff_ns以降のサンプルの (件数, 合計, 正値の件数, 正値の合計, 最大値) を返す
+        
+        期間が保持しているウィンドウ全体を含む場合は集計済みの値を使い、
+        それより短い期間のときだけサンプルを走査する
+        """
+        window = self.stats[key]
+        oldest_ns = window.oldest_ns()
+        if oldest_ns is None or oldest_ns > cutoff_ns:
+            return window.summary()
+        
+        values = window.values_since(cutoff_ns)
+        positives = [v for v in values if v > 0]
+        return len(values), sum(values), len(positives), sum(positives), max(values, default=0.0)
+    
+    def _collector_loop(self):
+        """メトリクスを収集してキューに渡す（収集スレッド）"""
+        # 収集にかかった時間の分だけ周期がずれないよう、絶対時刻で次の収集時刻を決める
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            metrics = self.collect_metrics()
+            try:
+                self._metrics_queue.put_nowait(metrics)
+            except queue.Full:
+                # 表示が追いつかない場合は最も古いものを捨てる
+                try:
+                    self._metrics_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self._metrics_queue.put_nowait(metrics)
+            
+            self._update_interval(metrics)
+            next_tick += self._cur_interval
+            now = time.monotonic()
+            if next_tick < now:
+                # 収集が1周期以上遅れた場合は、遅れた分をまとめて取り戻さず現在時刻から数え直す
+                next_tick = now
+            self._stop_event.wait(next_tick - now)
+    
+    def _update_interval(self, metrics: Dict[str, Any]):
+        """AIプロセスもNPU使用も無い間は収集間隔を段階的に延ばし、活動があればREFRESH_SECに戻す"""
+        if not metrics['ai_processes'] and metrics['npu_usage'] == 0:
+            self._idle_streak += 1
+        else:
+            self._idle_streak = 0
+        shift = min(IDLE_BACKOFF_MAX_SHIFT, self._idle_streak // IDLE_BACKOFF_TICKS)
+        self._cur_interval = REFRESH_SEC * (1 << shift)
+    
     def start_monitoring(self):
         """監視を開始"""
         self.print_header()
@@ -476,13 +965,26 @@ class NPUMonitor:
         print("Starting NPU monitoring... (Press Ctrl+C to stop)")
         print()
         
+        self.monitoring = True
+        self._stop_event.clear()
+        self.monitor_thread = threading.Thread(target=self._collector_loop, name="npu-collector", daemon=True)
+        self.monitor_thread.start()
+        
+        # 収集間隔が変わるため、統計表示はサンプル数ではなく経過時間で判断する
+        started = time.monotonic()
+        next_summary = started + SUMMARY_INTERVAL_SEC
         try:
             while True:
-                metrics = self.collect_metrics()
+                try:
+                    # タイムアウト付きで待つことでCtrl+Cに反応できるようにする
+                    metrics = self._metrics_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
                 self.display_metrics(metrics)
                 
                 # 5分ごとに統計表示
-                if len(self.stats['npu_usage']) % (5 * 60) == 0 and len(self.stats['npu_usage']) > 0:
+                if time.monotonic() >= next_summary:
+                    next_summary += SUMMARY_INTERVAL_SEC
                     stats = self.calculate_statistics(5)
                     print(f"\n--- 5-min Summary ---")
                     print(f"NPU Avg: {stats['npu_avg']:.1f}%, Max: {stats['npu_max']:.1f}%")
@@ -490,16 +992,18 @@ class NPUMonitor:
                     print(f"CPU Avg: {stats['cpu_avg']:.1f}%")
                     print(f"Samples: {stats['sample_count']}")
                 
-                time.sleep(REFRESH_SEC)
-                
         except KeyboardInterrupt:
+            self._stop_event.set()
+            self.monitor_thread.join(timeout=5)
+            self.monitoring = False
             print("\n\nMonitoring stopped.")
             
-            # 最終統計表示
+            # 最終統計表示（収集間隔は一定でないため、期間はサンプル数ではなく経過時間から決める）
+            elapsed = time.monotonic() - started
             if len(self.stats['npu_usage']) > 0:
-                final_stats = self.calculate_statistics(len(self.stats['npu_usage']) // 60 + 1)
+                final_stats = self.calculate_statistics(max(1, math.ceil(elapsed / 60)))
                 print("\n=== Final Statistics ===")
-                print(f"Total monitoring time: ~{final_stats['sample_count']} seconds")
+                print(f"Total monitoring time: ~{elapsed:.0f} seconds")
                 print(f"NPU Average usage: {final_stats['npu_avg']:.1f}%")
                 print(f"NPU Maximum usage: {final_stats['npu_max']:.1f}%")
                 print(f"AI activity ratio: {final_stats['ai_active_ratio']:.1f}%")